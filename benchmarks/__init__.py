@@ -0,0 +1,3 @@
+"""
+Myanmar Map Generator - Benchmarks
+"""
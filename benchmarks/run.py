@@ -0,0 +1,176 @@
+"""
+Myanmar Map Generator - Benchmark runner
+
+Times every stage of building and exporting a map on synthetic data,
+under a headless QgsApplication:
+
+    python -m myanmar_map_plugin.benchmarks.run --scale real
+    python -m myanmar_map_plugin.benchmarks.run --scale stress-10k --repeat 1 --dpi 150
+
+Each stage runs --repeat times and the results are written as JSON (one
+file per run), so numbers can be compared between plugin versions.
+"""
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from ..cache_utils import plugin_version
+from .startup import measure_startup
+from .synthetic import SCALES
+
+
+STAGES = ('excel_read_cold', 'excel_read_warm', 'layer_load', 'join', 'category_scan', 'styling',
+          'labeling', 'png_export', 'png_export_tiled', 'pdf_export', 'export_all')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='myanmar-map-bench', description='Benchmark the map pipeline.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='real')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (default: 3)')
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--page-size', choices=('A4', 'A3'), default='A4')
+    parser.add_argument('--data-dir', help='Where to keep the synthetic data (default: plugin cache)')
+    parser.add_argument('--output', help='Results JSON file (default: benchmarks/results/ in the plugin cache)')
+    parser.add_argument('--prefix-path', help='QGIS install prefix (default: $QGIS_PREFIX_PATH)')
+    return parser
+
+
+class Timer:
+    """Collects wall times per stage"""
+
+    def __init__(self):
+        self.runs = {}
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.runs.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        return {
+            stage: {'runs': runs, 'min': min(runs), 'median': statistics.median(runs)}
+            for stage, runs in self.runs.items()
+        }
+
+
+def run_once(timer, config, work_dir):
+    """One pass over every stage; returns feature and column counts"""
+    from qgis.core import QgsProject
+    from ..data_loader import clear_cache, load_table
+    from ..map_core import MapBuild, add_to_project, create_layout, export_outputs, style_layers
+    from ..map_export import export_png_tiled, export_target, fixed_label_layers
+    from ..map_join import build_joined_layer
+    from ..map_pipeline import category_counts, export_targets, find_map_item, load_layers
+
+    columns = [config.pcode_excel, config.category_col, config.township_col, config.label_col]
+
+    # Cold read parses the workbook; warm read comes from the sidecar cache
+    for sidecar in Path(os.environ['MYANMAR_MAP_CACHE']).glob('tables/*'):
+        sidecar.unlink()
+    clear_cache()
+    timer.time('excel_read_cold', load_table, config.excel_path, columns)
+    clear_cache()
+    df = timer.time('excel_read_warm', load_table, config.excel_path, columns)
+
+    state_layer, source_layer = timer.time('layer_load', load_layers, config.state_path, config.township_path)
+    township_layer, report = timer.time(
+        'join', build_joined_layer, source_layer, df, config.pcode_shp, config.pcode_excel
+    )
+    counts = timer.time('category_scan', category_counts, township_layer, config.category_col)
+    renderer, labeling = timer.time('styling', style_layers, config, state_layer, township_layer, counts)
+
+    project = QgsProject()
+    build = MapBuild(config, state_layer, township_layer, renderer, labeling, report)
+    add_to_project(build, project)
+    layout = create_layout(build, project)
+    map_item = find_map_item(layout)
+    layers = timer.time('labeling', fixed_label_layers, map_item, config.dpi)
+    if layers:
+        map_item.setLayers(layers)
+
+    targets = dict(export_targets(work_dir, config.title))
+    timer.time('png_export', export_target, layout, 'png', targets['png'], config.dpi)
+    # The same page forced through the strip path, to compare against png_export
+    timer.time('png_export_tiled', export_png_tiled, layout, Path(work_dir) / 'tiled.png', config.dpi)
+    timer.time('pdf_export', export_target, layout, 'pdf', targets['pdf'], config.dpi)
+
+    # The full export path: label placement plus both outputs
+    layout = create_layout(build, project)
+    timer.time('export_all', export_outputs, layout, list(targets.items()), config.dpi)
+    project.clear()
+    return {'townships': township_layer.featureCount(), 'rows': len(df), 'matched': report.matched}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    scale = SCALES[args.scale]
+
+    from ..cache_utils import cache_dir
+    from ..map_config import MapConfig
+    data_dir = Path(args.data_dir) if args.data_dir else cache_dir('benchmarks', args.scale)
+    results_dir = cache_dir('benchmarks', 'results')
+
+    # A private cache keeps sidecars and generalized layers from earlier runs out of the numbers
+    cache = tempfile.mkdtemp(prefix='myanmar_map_bench_')
+    os.environ['MYANMAR_MAP_CACHE'] = cache
+
+    from ..map_core import start_qgis
+    app = start_qgis(args.prefix_path)
+    try:
+        from qgis.core import Qgis
+        from .synthetic import generate
+
+        start = time.perf_counter()
+        paths = generate(data_dir, scale)
+        generate_time = time.perf_counter() - start
+
+        config = MapConfig(title=f'Benchmark {args.scale}', page_size=args.page_size, dpi=args.dpi,
+                           generalize=False, **paths)
+        timer = Timer()
+        work_dir = Path(cache) / 'outputs'
+        for _ in range(args.repeat):
+            counts = run_once(timer, config, work_dir)
+
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'plugin_version': plugin_version(),
+            'qgis_version': Qgis.QGIS_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'dataset': dict(vars(scale), **counts),
+            'settings': {'dpi': args.dpi, 'page_size': args.page_size, 'repeat': args.repeat},
+            'generate_seconds': generate_time,
+            'startup': measure_startup(),
+            'stages': timer.summary(),
+        }
+        output = Path(args.output) if args.output else (
+            results_dir /
+            f'{args.scale}_{results["plugin_version"]}_{datetime.now():%Y%m%d_%H%M%S}.json'
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2), encoding='utf-8')
+
+        for stage in STAGES:
+            if stage in results['stages']:
+                print(f'{stage:16} {results["stages"][stage]["median"]:9.3f} s')
+        print(f'{"plugin_startup":16} {results["startup"]["ms"] / 1000:9.3f} s')
+        print(f'Results: {output}')
+        return 0
+    finally:
+        app.exitQgis()
+        shutil.rmtree(cache, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
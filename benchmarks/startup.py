@@ -0,0 +1,72 @@
+"""
+Myanmar Map Generator - Startup budget check
+
+Measures what loading the plugin costs QGIS at launch: importing the
+package and the plugin class in a fresh interpreter, on top of the Qt
+modules QGIS has already loaded. Fails when the time exceeds the budget
+or when a heavy module (pandas, the dialog, ...) is imported early:
+
+    python -m myanmar_map_plugin.benchmarks.startup
+"""
+
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+# Milliseconds the plugin may add to QGIS startup
+STARTUP_BUDGET_MS = 30
+
+# Modules that must only be imported once the dialog is opened
+DEFERRED_MODULES = ('pandas', 'numpy', 'openpyxl', 'pyarrow', '{package}.myanmar_map_dialog',
+                    '{package}.map_core', '{package}.data_loader')
+
+_PROBE = '''
+import json, sys, time
+import qgis.PyQt.QtWidgets, qgis.PyQt.QtGui
+start = time.perf_counter()
+from {package} import classFactory
+from {package}.myanmar_map import MyanmarMapPlugin
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {deferred!r} if m in sys.modules]}}))
+'''
+
+
+def measure_startup(runs=5):
+    """Best-of-runs import time in ms and any deferred modules that were loaded"""
+    package = PLUGIN_DIR.name
+    deferred = [m.format(package=package) for m in DEFERRED_MODULES]
+    probe = _PROBE.format(package=package, deferred=deferred)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', probe], cwd=PLUGIN_DIR.parent,
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'ms': min(r['ms'] for r in results),
+        'budget_ms': STARTUP_BUDGET_MS,
+        'loaded': sorted({m for r in results for m in r['loaded']}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='myanmar-map-startup', description='Check the plugin startup budget.')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = measure_startup(args.runs)
+    print(f'Plugin load: {result["ms"]:.1f} ms (budget {STARTUP_BUDGET_MS} ms)')
+    ok = result['ms'] <= STARTUP_BUDGET_MS and not result['loaded']
+    if result['loaded']:
+        print(f'Imported at startup but should be deferred: {", ".join(result["loaded"])}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Myanmar Map Generator - Synthetic benchmark data
+
+Generates state and township shapefiles and a matching workbook at a
+chosen scale. Townships are cells of a grid over Myanmar's bounding box
+with jagged, shared edges (so coverage simplification and labeling have
+realistic work to do), and states are unions of blocks of townships.
+The data is deterministic for a given scale and seed.
+"""
+
+from dataclasses import dataclass, asdict
+from pathlib import Path
+import json
+import math
+import random
+
+import pandas as pd
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsCoordinateReferenceSystem, QgsCoordinateTransformContext, QgsFeature, QgsField,
+    QgsFields, QgsGeometry, QgsPointXY, QgsVectorFileWriter, QgsWkbTypes
+)
+
+
+# Longitude/latitude bounding box of Myanmar
+EXTENT = (92.2, 9.8, 101.2, 28.5)
+
+CATEGORIES = ['Health', 'Education', 'WASH', 'Protection', 'Nutrition', 'Shelter', 'Livelihoods', 'Multi-sector']
+
+
+@dataclass
+class Scale:
+    """Size of a synthetic dataset"""
+    townships: int
+    states: int
+    columns: int
+    edge_vertices: int
+    sheets: int = 1
+
+
+SCALES = {
+    'real': Scale(townships=330, states=15, columns=20, edge_vertices=60),
+    'stress-10k': Scale(townships=10_000, states=60, columns=120, edge_vertices=20, sheets=3),
+    'stress-100k': Scale(townships=100_000, states=200, columns=120, edge_vertices=6),
+}
+
+
+def generate(folder, scale, seed=1):
+    """Write the dataset for a scale into folder, unless already there; returns the paths"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = {
+        'state_path': str(folder / 'states.shp'),
+        'township_path': str(folder / 'townships.shp'),
+        'excel_path': str(folder / 'data.xlsx'),
+    }
+    stamp = folder / 'dataset.json'
+    description = {'scale': asdict(scale), 'seed': seed}
+    if stamp.exists() and json.loads(stamp.read_text(encoding='utf-8')) == description:
+        return paths
+
+    rows, cols = _grid_shape(scale.townships)
+    pcodes = [f'MMR{i // 1000 + 1:03d}{i % 1000 + 1:03d}' for i in range(scale.townships)]
+    geometries = township_geometries(rows, cols, scale.townships, scale.edge_vertices, seed)
+    state_ids = _state_ids(rows, cols, scale.townships, scale.states)
+
+    write_townships(paths['township_path'], geometries, pcodes, state_ids)
+    write_states(paths['state_path'], geometries, state_ids)
+    write_workbook(paths['excel_path'], pcodes, scale, seed)
+    stamp.write_text(json.dumps(description), encoding='utf-8')
+    return paths
+
+
+def _grid_shape(count):
+    """Rows and columns of a grid with about count cells, shaped like the extent"""
+    width, height = EXTENT[2] - EXTENT[0], EXTENT[3] - EXTENT[1]
+    rows = max(1, round(math.sqrt(count * height / width)))
+    return rows, math.ceil(count / rows)
+
+
+def _edge(rng, start, end, vertices, amplitude):
+    """Points strictly between start and end, jittered across the edge"""
+    (x0, y0), (x1, y1) = start, end
+    nx, ny = y0 - y1, x1 - x0
+    points = []
+    for k in range(1, vertices):
+        t = k / vertices
+        offset = amplitude * math.sin(math.pi * t) * rng.uniform(-1, 1)
+        points.append((x0 + t * (x1 - x0) + offset * nx, y0 + t * (y1 - y0) + offset * ny))
+    return points
+
+
+def township_geometries(rows, cols, count, edge_vertices, seed):
+    """Polygons for the first count cells of the grid
+
+    Every edge is generated once from its own seed, so neighbouring cells
+    share exactly the same boundary vertices.
+    """
+    dx = (EXTENT[2] - EXTENT[0]) / cols
+    dy = (EXTENT[3] - EXTENT[1]) / rows
+
+    def node(i, j):
+        return EXTENT[0] + i * dx, EXTENT[1] + j * dy
+
+    def edge(kind, i, j):
+        rng = random.Random(f'{seed}-{kind}-{i}-{j}')
+        end = node(i + 1, j) if kind == 'h' else node(i, j + 1)
+        return _edge(rng, node(i, j), end, edge_vertices, 0.08)
+
+    geometries = []
+    for n in range(count):
+        j, i = divmod(n, cols)
+        ring = [node(i, j)] + edge('h', i, j)
+        ring += [node(i + 1, j)] + edge('v', i + 1, j)
+        ring += [node(i + 1, j + 1)] + edge('h', i, j + 1)[::-1]
+        ring += [node(i, j + 1)] + edge('v', i, j)[::-1]
+        ring.append(ring[0])
+        geometries.append(QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring]]))
+    return geometries
+
+
+def _state_ids(rows, cols, count, states):
+    """State number of each township: contiguous blocks of the grid"""
+    block_rows = max(1, round(math.sqrt(states * rows / cols)))
+    block_cols = math.ceil(states / block_rows)
+    ids = []
+    for n in range(count):
+        j, i = divmod(n, cols)
+        ids.append(min(states, (j * block_rows // rows) * block_cols + i * block_cols // cols + 1))
+    return ids
+
+
+def _write_shapefile(path, fields, features):
+    crs = QgsCoordinateReferenceSystem('EPSG:4326')
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'ESRI Shapefile'
+    options.fileEncoding = 'UTF-8'
+    writer = QgsVectorFileWriter.create(
+        str(path), fields, QgsWkbTypes.MultiPolygon, crs, QgsCoordinateTransformContext(), options
+    )
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f'Failed to write {path}: {writer.errorMessage()}')
+    writer.addFeatures(features)
+    del writer
+
+
+def write_townships(path, geometries, pcodes, state_ids):
+    fields = QgsFields()
+    for name, kind in (('TS_PCODE', QVariant.String), ('TS', QVariant.String), ('ST_ID', QVariant.Int)):
+        fields.append(QgsField(name, kind))
+    features = []
+    for n, geometry in enumerate(geometries):
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        feature.setAttributes([pcodes[n], f'Township {n + 1}', state_ids[n]])
+        features.append(feature)
+    _write_shapefile(path, fields, features)
+
+
+def write_states(path, geometries, state_ids):
+    fields = QgsFields()
+    fields.append(QgsField('ST_ID', QVariant.Int))
+    fields.append(QgsField('ST', QVariant.String))
+    parts = {}
+    for geometry, state in zip(geometries, state_ids):
+        parts.setdefault(state, []).append(geometry)
+    features = []
+    for state, members in sorted(parts.items()):
+        feature = QgsFeature(fields)
+        feature.setGeometry(QgsGeometry.unaryUnion(members))
+        feature.setAttributes([state, f'State {state}'])
+        features.append(feature)
+    _write_shapefile(path, fields, features)
+
+
+def data_frame(pcodes, scale, seed, sheet=0):
+    """Data rows for about 90% of the townships, with the columns the map uses
+
+    A few rows have P_Codes that are not in the shapefile, one P_Code is
+    duplicated and one row has none, so the join report has work to do.
+    """
+    rng = random.Random(f'{seed}-sheet-{sheet}')
+    rows = [p for p in pcodes if rng.random() < 0.9]
+    rows += ['MMR999001', 'MMR999002', rows[0], None]
+    count = len(rows)
+    names = {p: f'Township {n + 1}' for n, p in enumerate(pcodes)}
+    data = {
+        'TS_Pcode': rows,
+        'Township': [names.get(p, 'Unknown') for p in rows],
+        'Thematic25': [rng.choice(CATEGORIES) for _ in range(count)],
+        'IP_25': [rng.randint(0, 40) for _ in range(count)],
+    }
+    for c in range(len(data), scale.columns):
+        kind = c % 3
+        if kind == 0:
+            values = [rng.randint(0, 10_000) for _ in range(count)]
+        elif kind == 1:
+            values = [round(rng.random() * 100, 2) for _ in range(count)]
+        else:
+            values = [rng.choice(CATEGORIES) for _ in range(count)]
+        data[f'V{c:03d}'] = values
+    return pd.DataFrame(data)
+
+
+def write_workbook(path, pcodes, scale, seed):
+    with pd.ExcelWriter(path) as writer:
+        for sheet in range(scale.sheets):
+            data_frame(pcodes, scale, seed, sheet).to_excel(writer, sheet_name=f'Sheet{sheet + 1}', index=False)
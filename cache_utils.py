@@ -0,0 +1,139 @@
+"""
+Myanmar Map Generator - Shared cache helpers
+"""
+
+from pathlib import Path
+import configparser
+import hashlib
+import os
+import threading
+
+
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+PLUGIN_DIR = Path(__file__).resolve().parent
+
+_content_hashes = {}
+_content_lock = threading.Lock()
+
+
+def cache_dir(*parts):
+    """Return (and create) a directory under the plugin cache root
+
+    The root can be overridden with the MYANMAR_MAP_CACHE environment variable.
+    """
+    base = os.environ.get('MYANMAR_MAP_CACHE')
+    if not base:
+        root = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+        base = Path(root) if root else Path.home() / '.cache'
+        base = base / 'myanmar_map'
+    path = Path(base, *parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def file_signature(path):
+    """Cheap identity of a file on disk: (absolute path, mtime, size)"""
+    path = Path(path).resolve()
+    stat = path.stat()
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def short_hash(*values):
+    """Short stable hash of the given values, for use in cache file names"""
+    digest = hashlib.sha1('|'.join(str(v) for v in values).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def dataset_files(path):
+    """Files making up a dataset: all parts of a shapefile, or the file itself"""
+    path = Path(path)
+    if path.suffix.lower() != '.shp':
+        return [path]
+    return [p for p in (path.with_suffix(ext) for ext in SHAPEFILE_PARTS) if p.exists()]
+
+
+def content_hash(*paths):
+    """SHA-1 of the contents of the given files
+
+    Hashes are remembered per file signature, so unchanged files are only
+    read once per session.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        signature = file_signature(path)
+        with _content_lock:
+            file_digest = _content_hashes.get(signature)
+        if file_digest is None:
+            h = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            file_digest = h.hexdigest()
+            with _content_lock:
+                _content_hashes[signature] = file_digest
+        digest.update(file_digest.encode('ascii'))
+    return digest.hexdigest()
+
+
+def plugin_version():
+    """Plugin version from metadata.txt"""
+    metadata = configparser.ConfigParser()
+    metadata.read(PLUGIN_DIR / 'metadata.txt', encoding='utf-8')
+    return metadata.get('general', 'version', fallback='unknown')
+
+
+def remove_file(path):
+    """Delete a file if it exists (Path.unlink(missing_ok=True) needs Python 3.8)"""
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def temp_path(path):
+    """Hidden temporary name next to path, unique per process and thread, same suffix"""
+    path = Path(path)
+    return path.with_name(f'.{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}')
+
+
+def atomic_write(path, content):
+    """Write a file through a temporary file and move it into place when complete
+
+    content is text, bytes, or a function writing the temporary path; when
+    the function returns False (e.g. cancelled), path is left untouched.
+    Readers never see a partial file, and the temporary file is removed
+    if writing fails. Returns False if the write was abandoned.
+    """
+    path = Path(path)
+    tmp = temp_path(path)
+    try:
+        if isinstance(content, str):
+            tmp.write_text(content, encoding='utf-8')
+        elif isinstance(content, bytes):
+            tmp.write_bytes(content)
+        elif content(tmp) is False:
+            return False
+        os.replace(tmp, path)
+        return True
+    finally:
+        remove_file(tmp)
+
+
+def prune_cache(folder, pattern, keep, companions=()):
+    """Delete all but the keep most recently used files of a cache folder
+
+    Files being written (see temp_path) are left alone; companions are
+    suffixes of files deleted together with each file, e.g. world files.
+    """
+    files = []
+    for path in Path(folder).glob(pattern):
+        try:
+            if '.tmp' not in path.suffixes:
+                files.append((path.stat().st_mtime, path))
+        except OSError:
+            pass
+    files.sort(reverse=True)
+    for _, path in files[keep:]:
+        remove_file(path)
+        for suffix in companions:
+            remove_file(path.with_suffix(suffix))
@@ -0,0 +1,88 @@
+"""
+Myanmar Map Generator - Command line entry point
+
+Runs the map pipeline under a headless QgsApplication, e.g. from cron or CI:
+
+    python -m myanmar_map_plugin.cli --config map.json --output-path Output
+    python -m myanmar_map_plugin.cli --config map.json --batch jobs.csv --workers 4
+
+Options named after the MapConfig fields override values from --config.
+Set QGIS_PREFIX_PATH when QGIS is not installed under the default prefix.
+"""
+
+from dataclasses import fields
+import argparse
+import sys
+
+from .map_config import MapConfig
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='myanmar-map',
+        description='Generate Myanmar township thematic maps without the QGIS desktop.'
+    )
+    parser.add_argument('--config', help='JSON file with MapConfig values')
+    parser.add_argument('--batch', help='JSON/CSV batch jobs file (one map per job)')
+    parser.add_argument('--workers', type=int, help='Worker processes for batch rendering')
+    parser.add_argument('--prefix-path', help='QGIS install prefix (default: $QGIS_PREFIX_PATH)')
+
+    group = parser.add_argument_group('map settings')
+    for field in fields(MapConfig):
+        option = '--' + field.name.replace('_', '-')
+        if field.type in (bool, 'bool'):
+            _add_flag(group, option, field.name)
+        else:
+            kind = {'int': int, 'float': float}.get(getattr(field.type, '__name__', field.type), str)
+            group.add_argument(option, dest=field.name, type=kind, default=None)
+    return parser
+
+
+def _add_flag(group, option, dest):
+    """--option / --no-option; argparse.BooleanOptionalAction exists from Python 3.9"""
+    if hasattr(argparse, 'BooleanOptionalAction'):
+        group.add_argument(option, dest=dest, action=argparse.BooleanOptionalAction, default=None)
+        return
+    group.add_argument(option, dest=dest, action='store_true', default=None)
+    group.add_argument('--no-' + option[2:], dest=dest, action='store_false', default=None)
+
+
+def config_from_args(args):
+    """MapConfig from --config plus any command line overrides"""
+    config = MapConfig.from_json(args.config) if args.config else MapConfig()
+    overrides = {
+        f.name: getattr(args, f.name) for f in fields(MapConfig)
+        if getattr(args, f.name) is not None
+    }
+    return config.replace(**overrides)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = config_from_args(args)
+
+    # QGIS modules are imported only after argument parsing, so --help works anywhere
+    from .map_core import run_map, start_qgis
+    app = start_qgis(args.prefix_path)
+    try:
+        if args.batch:
+            from .map_batch import load_jobs, run_batch
+            manifest = run_batch(config, load_jobs(args.batch), workers=args.workers)
+            failed = [job for job in manifest['jobs'] if job['status'] not in ('ok', 'skipped')]
+            for job in failed:
+                print(f'FAILED {job["title"]}: {job["error"]}', file=sys.stderr)
+            print(f'Manifest: {manifest["path"]}')
+            return 1 if failed else 0
+
+        outputs, report = run_map(config)
+        if report is not None and not report.ok:
+            print(report.summary(), file=sys.stderr)
+        for path in outputs:
+            print(path)
+        return 0
+    finally:
+        app.exitQgis()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
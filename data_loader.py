@@ -0,0 +1,388 @@
+"""
+Myanmar Map Generator - Data ingestion with caching
+
+Tables come from Excel workbooks, CSV or Parquet files through a reader
+per file type. Each reader reads only the requested columns.
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .cache_utils import atomic_write, cache_dir, file_signature, remove_file, short_hash
+
+
+MAX_CACHED_FRAMES = 8
+CSV_CHUNK_ROWS = 100_000
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_RATIO = 0.5
+
+try:
+    import pyarrow  # noqa: F401
+    SIDECAR_EXT = '.feather'
+except ImportError:
+    SIDECAR_EXT = '.pkl'
+
+
+class FrameCache:
+    """Small LRU cache of parsed DataFrames"""
+
+    def __init__(self, max_entries=MAX_CACHED_FRAMES):
+        self.max_entries = max_entries
+        self._frames = OrderedDict()
+
+    def get(self, key):
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+        return frame
+
+    def put(self, key, frame):
+        self._frames[key] = frame
+        self._frames.move_to_end(key)
+        while len(self._frames) > self.max_entries:
+            self._frames.popitem(last=False)
+
+    def clear(self):
+        self._frames.clear()
+
+
+_frames = FrameCache()
+_columns = FrameCache(max_entries=32)
+
+
+def read_columns(path, sheet_name=0):
+    """Return the column names of a table (sheet), reading only the header"""
+    key = (file_signature(path), sheet_name)
+    columns = _columns.get(key)
+    if columns is None:
+        columns = [str(c) for c in reader_for(path).columns(path, sheet_name)]
+        _columns.put(key, columns)
+    return list(columns)
+
+
+def list_sheets(path):
+    """Sheet names of a workbook; a single 0 for formats without sheets"""
+    return reader_for(path).sheets(path)
+
+
+def sheet_key(value):
+    """sheet_name argument for a sheet: '' is the first sheet, text a sheet name, an int a position"""
+    if isinstance(value, int):
+        return value
+    return (value or '').strip() or 0
+
+
+def resolve_sheet(value, sheets):
+    """sheet_name for a sheet written in a jobs file
+
+    Text naming one of sheets is that sheet, even when it is all digits
+    (e.g. '2025'); other digit-only text is a position.
+    """
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    for sheet in sheets:
+        if str(sheet) == value:
+            return sheet
+    return int(value) if value.isdigit() else sheet_key(value)
+
+
+def load_table(path, columns=None, sheet_name=0):
+    """Load a table, materializing only the requested columns
+
+    The reader for the file type only reads the requested columns, and
+    string columns with repeated values become pandas categoricals.
+    Loaded frames are kept in an in-memory LRU cache keyed by path, mtime
+    and size. Columns read from a file are also kept in a columnar
+    sidecar in the plugin cache, so later runs skip parsing for them.
+    """
+    signature = file_signature(path)
+    wanted = tuple(dict.fromkeys(c for c in (columns or []) if c))
+    key = (signature, sheet_name, wanted)
+
+    df = _frames.get(key)
+    if df is not None:
+        return df
+
+    cached = _read_sidecar(signature, sheet_name) if wanted else None
+    missing = [c for c in wanted if cached is None or c not in cached.columns]
+    if missing or not wanted:
+        df = compact_dtypes(reader_for(path).read(path, missing, sheet_name))
+        if wanted:
+            cached = df if cached is None else pd.concat([cached, df], axis=1)
+            _write_sidecar(cached, signature, sheet_name)
+    if wanted:
+        df = _project(cached, wanted)
+
+    _frames.put(key, df)
+    return df
+
+
+def clear_cache():
+    """Drop all in-memory frames (sidecars on disk are kept)"""
+    _frames.clear()
+    _columns.clear()
+
+
+def compact_dtypes(df, max_ratio=CATEGORY_RATIO):
+    """Store text columns with repeated values as categoricals
+
+    Memory for such a column then grows with the number of distinct
+    values rather than the number of rows.
+    """
+    for column in df.columns:
+        series = df[column]
+        if not _is_text(series) or len(series) == 0:
+            continue
+        if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+            continue
+        if series.nunique(dropna=True) <= max_ratio * len(series):
+            df[column] = series.astype('category')
+    return df
+
+
+def _is_text(series):
+    """Object or string column (not yet categorical)"""
+    return not isinstance(series.dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(series.dtype)
+
+
+def _project(df, columns):
+    """Restrict df to the given columns, keeping the source order"""
+    if not columns:
+        return df
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise KeyError(f'Column(s) not found in data: {", ".join(missing)}')
+    return df[[c for c in df.columns if c in columns]]
+
+
+def _check_columns(available, columns):
+    missing = [c for c in columns if c not in available]
+    if missing:
+        raise KeyError(f'Column(s) not found in data: {", ".join(missing)}')
+
+
+class TableReader:
+    """Reads one file format; register subclasses with register_reader"""
+
+    def sheets(self, path):
+        return [0]
+
+    def columns(self, path, sheet_name=0):
+        raise NotImplementedError
+
+    def read(self, path, columns, sheet_name=0):
+        """DataFrame with only the given columns (all columns when empty)"""
+        raise NotImplementedError
+
+
+class XlsxReader(TableReader):
+    """Streams rows with openpyxl in read-only mode, keeping only the wanted cells"""
+
+    def _open(self, path):
+        import openpyxl
+        return openpyxl.load_workbook(path, read_only=True, data_only=True)
+
+    @staticmethod
+    def _sheet(workbook, sheet_name):
+        if isinstance(sheet_name, int):
+            return workbook.worksheets[sheet_name]
+        return workbook[sheet_name]
+
+    @staticmethod
+    def _header(row):
+        names, seen = [], {}
+        for i, value in enumerate(row):
+            name = f'Unnamed: {i}' if value is None else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f'{name}.{seen[name]}'
+            else:
+                seen[name] = 0
+            names.append(name)
+        return names
+
+    def sheets(self, path):
+        workbook = self._open(path)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+    def columns(self, path, sheet_name=0):
+        workbook = self._open(path)
+        try:
+            rows = self._sheet(workbook, sheet_name).iter_rows(values_only=True)
+            return self._header(next(rows, ()))
+        finally:
+            workbook.close()
+
+    def read(self, path, columns, sheet_name=0):
+        workbook = self._open(path)
+        try:
+            rows = self._sheet(workbook, sheet_name).iter_rows(values_only=True)
+            header = self._header(next(rows, ()))
+            columns = list(columns) or header
+            _check_columns(header, columns)
+            indexes = [header.index(c) for c in columns]
+            values = [[] for _ in columns]
+            last = -1
+            for n, row in enumerate(rows):
+                for target, i in zip(values, indexes):
+                    target.append(row[i] if i < len(row) else None)
+                if any(v is not None for v in row):
+                    last = n
+        finally:
+            workbook.close()
+        # Formatted but empty rows at the end of a sheet are not data
+        return pd.DataFrame({c: pd.Series(v[:last + 1]) for c, v in zip(columns, values)})
+
+
+class XlsReader(TableReader):
+    """Legacy .xls workbooks through pandas (xlrd)"""
+
+    def sheets(self, path):
+        return list(pd.ExcelFile(path).sheet_names)
+
+    def columns(self, path, sheet_name=0):
+        return pd.read_excel(path, sheet_name=sheet_name, nrows=0).columns
+
+    def read(self, path, columns, sheet_name=0):
+        if columns:
+            _check_columns([str(c) for c in self.columns(path, sheet_name)], columns)
+        df = pd.read_excel(path, sheet_name=sheet_name, usecols=list(columns) or None)
+        df.columns = [str(c) for c in df.columns]
+        return df
+
+
+class CsvReader(TableReader):
+    """Reads CSV in chunks; text columns are made categorical chunk by chunk"""
+
+    chunk_rows = CSV_CHUNK_ROWS
+
+    def columns(self, path, sheet_name=0):
+        return pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns
+
+    def read(self, path, columns, sheet_name=0):
+        if columns:
+            _check_columns([str(c) for c in self.columns(path)], columns)
+        chunks = []
+        for chunk in pd.read_csv(path, usecols=list(columns) or None, chunksize=self.chunk_rows,
+                                 encoding='utf-8-sig'):
+            for column in chunk.columns:
+                if _is_text(chunk[column]):
+                    chunk[column] = chunk[column].astype('category')
+            chunks.append(chunk)
+        if not chunks:
+            return pd.DataFrame(columns=list(columns) or list(self.columns(path)))
+        df = _concat_chunks(chunks)
+        # Mostly-unique columns (keys, names) are cheaper as plain values
+        for column in df.columns:
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype) and \
+                    len(series.cat.categories) > CATEGORY_RATIO * len(series):
+                df[column] = series.astype(object)
+        return df
+
+
+class ParquetReader(TableReader):
+    """Reads only the requested columns of a Parquet file"""
+
+    def columns(self, path, sheet_name=0):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Reading Parquet files requires the pyarrow package')
+        return pq.ParquetFile(path).schema_arrow.names
+
+    def read(self, path, columns, sheet_name=0):
+        if columns:
+            _check_columns(self.columns(path), columns)
+        return pd.read_parquet(path, columns=list(columns) or None)
+
+
+def _concat_chunks(chunks):
+    """Concatenate CSV chunks, merging the categories of categorical columns"""
+    data = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[column] = pd.Series(union_categoricals([part.array for part in parts]))
+        else:
+            parts = [part.astype(object) if isinstance(part.dtype, pd.CategoricalDtype) else part
+                     for part in parts]
+            data[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+_readers = {}
+
+
+def register_reader(reader, *extensions):
+    """Use reader for files with the given extensions (e.g. '.csv')"""
+    for extension in extensions:
+        _readers[extension.lower()] = reader
+
+
+def reader_for(path):
+    extension = Path(path).suffix.lower()
+    reader = _readers.get(extension)
+    if reader is None:
+        raise ValueError(f'Unsupported data file type: {extension or path}')
+    return reader
+
+
+register_reader(XlsxReader(), '.xlsx', '.xlsm')
+register_reader(XlsReader(), '.xls')
+register_reader(CsvReader(), '.csv', '.txt')
+register_reader(ParquetReader(), '.parquet', '.pq')
+
+DATA_FILE_FILTER = 'Data files (*.xlsx *.xlsm *.xls *.csv *.parquet)'
+
+
+def _sidecar_path(signature, sheet_name, ext=SIDECAR_EXT):
+    path, mtime, size = signature
+    name = f'{short_hash(path)}_{short_hash(mtime, size)}_{short_hash(sheet_name)}{ext}'
+    return cache_dir('tables') / name
+
+
+def _read_sidecar(signature, sheet_name):
+    """Columns stored by earlier loads, or None"""
+    for ext in dict.fromkeys((SIDECAR_EXT, '.pkl')):
+        sidecar = _sidecar_path(signature, sheet_name, ext)
+        if not sidecar.exists():
+            continue
+        try:
+            return pd.read_feather(sidecar) if ext == '.feather' else pd.read_pickle(sidecar)
+        except Exception:
+            remove_file(sidecar)
+    return None
+
+
+def _write_sidecar(df, signature, sheet_name):
+    """Persist a parsed sheet and drop sidecars of older file versions"""
+    target = _sidecar_path(signature, sheet_name)
+    path_key, version_key = target.name.split('_')[:2]
+    for old in target.parent.glob(f'{path_key}_*'):
+        if not old.name.startswith(f'{path_key}_{version_key}_'):
+            remove_file(old)
+
+    try:
+        if SIDECAR_EXT == '.feather':
+            try:
+                atomic_write(target, lambda tmp: df.reset_index(drop=True).to_feather(tmp))
+                remove_file(target.with_suffix('.pkl'))
+                return
+            except OSError:
+                raise
+            except Exception:
+                # Mixed-type object columns cannot be stored by Arrow
+                remove_file(target)
+                target = target.with_suffix('.pkl')
+        atomic_write(target, df.to_pickle)
+    except OSError:
+        pass
+
@@ -0,0 +1,251 @@
+"""
+Myanmar Map Generator - Hierarchical aggregation
+
+Rolls township rows up to districts (adm2) or States/Regions (adm1).
+Each township gets a parent P_Code, from a parent field of the township
+layer (ST_PCODE, DT_PCODE) or a prefix of its own P_Code, and the data
+is grouped on it with pandas: count, sum, share and mode per column.
+The results are joined onto the state layer, a district layer, or
+district polygons dissolved from the townships, which are kept in the
+plugin cache.
+"""
+
+from dataclasses import dataclass
+import re
+import threading
+
+import pandas as pd
+from qgis.core import (
+    QgsFeature, QgsFeatureRequest, QgsField, QgsFields, QgsGeometry, QgsMemoryProviderUtils,
+    QgsVectorLayer, QgsWkbTypes
+)
+from qgis.PyQt.QtCore import QVariant
+
+from .cache_utils import atomic_write, cache_dir, content_hash, dataset_files, short_hash
+from .map_join import build_joined_layer, normalize_pcode, normalize_pcodes
+from .map_pipeline import category_value, save_layer_to_gpkg
+
+
+# Default parent field, name field and P_Code prefix length per level (MIMU codes)
+LEVELS = {
+    'district': ('DT_PCODE', 'DT', 0),
+    'state': ('ST_PCODE', 'ST', 6),
+}
+FUNCTIONS = ('count', 'sum', 'share', 'mode')
+PARENT_COLUMN = 'parent_pcode'
+GPKG_LAYER = 'dissolved'
+
+_SPEC = re.compile(r'^\s*([^=]+?)\s*=\s*(\w+)\(\s*([^,)]*?)\s*(?:,\s*([^)]*?)\s*)?\)\s*$')
+_lock = threading.Lock()
+
+
+@dataclass
+class Aggregation:
+    """One output field: func applied to a data column per parent unit"""
+    name: str
+    func: str
+    column: str = ''
+    value: str = ''
+
+
+def parse_aggregations(spec):
+    """Aggregations from 'name=func(column[, value])' terms separated by ';'
+
+    e.g. 'Thematic25=mode(Thematic25); n=count(Thematic25); pct_A=share(Thematic25, A); pop=sum(Pop)'
+    """
+    aggregations = []
+    for term in filter(str.strip, spec.split(';')):
+        match = _SPEC.match(term)
+        if not match or match.group(2) not in FUNCTIONS:
+            raise ValueError(f'Invalid aggregation "{term.strip()}", expected name=func(column) '
+                             f'with func one of {", ".join(FUNCTIONS)}')
+        name, func, column, value = match.groups()
+        if func in ('sum', 'share', 'mode') and not column:
+            raise ValueError(f'Aggregation "{name}" needs a column')
+        aggregations.append(Aggregation(name, func, column, value or ''))
+    return aggregations
+
+
+def config_aggregations(config):
+    """The config's aggregations; by default the mode category and a township count"""
+    if config.aggregations:
+        return parse_aggregations(config.aggregations)
+    aggregations = [Aggregation(config.category_col, 'mode', config.category_col)]
+    if config.label_col and config.label_col != config.category_col:
+        aggregations.append(Aggregation(config.label_col, 'count', config.category_col))
+    return aggregations
+
+
+def aggregation_columns(aggregations):
+    return [c for c in dict.fromkeys(a.column for a in aggregations) if c]
+
+
+def name_column(config):
+    """Field shown in labels: the township name, or the unit name when aggregated"""
+    if config.level not in LEVELS:
+        return config.township_col
+    return config.unit_name_col or LEVELS[config.level][1]
+
+
+def unit_pcode_field(config):
+    return config.unit_pcode or LEVELS[config.level][0]
+
+
+def parent_spec(config, township_layer):
+    """(parent field, prefix length) locating each township's parent unit"""
+    default_field, _, default_prefix = LEVELS[config.level]
+    field = config.parent_field
+    if not field and township_layer.fields().indexOf(default_field) >= 0:
+        field = default_field
+    if field:
+        if township_layer.fields().indexOf(field) < 0:
+            raise ValueError(f'Township layer has no field "{field}"')
+        return field, 0
+    prefix = config.parent_prefix or default_prefix
+    if not prefix:
+        raise ValueError(f'Set the parent field: the township layer has no "{default_field}" field')
+    return '', prefix
+
+
+def township_parents(township_layer, pcode_shp, parent_field='', prefix=0, name_col=''):
+    """Frame of normalized township P_Codes (_key) and their parent P_Codes (_parent)"""
+    fields = township_layer.fields()
+    attributes = [pcode_shp] + [f for f in (parent_field, name_col) if f and fields.indexOf(f) >= 0]
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes(attributes, fields)
+    rows = [[feature[a] for a in attributes] for feature in township_layer.getFeatures(request)]
+    frame = pd.DataFrame(rows, columns=attributes, dtype=object)
+
+    keys = normalize_pcodes(frame[pcode_shp])
+    parents = normalize_pcodes(frame[parent_field]) if parent_field else keys.str[:prefix]
+    result = pd.DataFrame({'_key': keys, '_parent': parents})
+    if name_col in frame.columns:
+        result['_name'] = frame[name_col]
+    return result
+
+
+def aggregate(frame, aggregations):
+    """One row per parent unit with a column per aggregation
+
+    frame has one row per township: _parent, _matched (has a data row)
+    and the data columns.
+    """
+    groups = frame.groupby('_parent', sort=True)
+    result = pd.DataFrame(index=pd.Index(sorted(frame['_parent'].unique()), name='_parent'))
+    for agg in aggregations:
+        if agg.name in result.columns:
+            continue
+        if agg.func == 'count':
+            values = groups[agg.column].count() if agg.column else groups['_matched'].sum()
+        elif agg.func == 'sum':
+            values = pd.to_numeric(frame[agg.column], errors='coerce').groupby(frame['_parent']).sum(min_count=1)
+        else:
+            categories = _categories(frame[agg.column])
+            if agg.func == 'share':
+                hits = (categories == category_value(agg.value)).where(categories.notna())
+                values = (hits.astype(float).groupby(frame['_parent']).mean() * 100).round(1)
+            else:
+                values = _mode(frame['_parent'], categories)
+        result[agg.name] = values
+    return result
+
+
+def _categories(series):
+    """Category keys of a column as in the renderer; no data stays NaN"""
+    series = series.astype(object)
+    keys = {value: category_value(value) for value in series.dropna().unique()}
+    return series.map(keys)
+
+
+def _mode(parents, categories):
+    """Most frequent category per parent; ties go to the first in sort order"""
+    counts = (pd.DataFrame({'_parent': parents, 'category': categories}).dropna()
+              .groupby(['_parent', 'category']).size().reset_index(name='n'))
+    counts = counts.sort_values(['_parent', 'n', 'category'], ascending=[True, False, True])
+    return counts.drop_duplicates('_parent').set_index('_parent')['category']
+
+
+def aggregated_layer(config, township_layer, state_layer, df, aggregations=None):
+    """Memory layer of the parent units of config.level with the aggregated data
+
+    township_layer is the source township layer, df the data table with
+    the P_Code column and every column the aggregations use. Returns
+    (layer, JoinReport of the units).
+    """
+    aggregations = aggregations or config_aggregations(config)
+    parent_field, prefix = parent_spec(config, township_layer)
+    key_field = unit_pcode_field(config)
+    name_col = name_column(config)
+    parents = township_parents(township_layer, config.pcode_shp, parent_field, prefix, name_col)
+
+    # One row per township, first data row per P_Code as in the township join
+    data = df[df[config.pcode_excel].notna()]
+    data = data.assign(_key=normalize_pcodes(data[config.pcode_excel]).values).drop_duplicates('_key')
+    frame = parents.merge(data[['_key'] + aggregation_columns(aggregations)], on='_key', how='left',
+                          indicator=True)
+    frame['_matched'] = frame.pop('_merge') == 'both'
+    result = aggregate(frame, aggregations).rename_axis(PARENT_COLUMN).reset_index()
+
+    if config.level == 'state':
+        units = state_layer
+    elif config.district_path:
+        units = QgsVectorLayer(config.district_path, 'Districts', 'ogr')
+        if not units.isValid():
+            raise ValueError(f'Could not load shapefile: {config.district_path}')
+    else:
+        units = dissolved_layer(township_layer, config.township_path, config.pcode_shp, parents,
+                                parent_field, prefix, key_field, name_col)
+    if units.fields().indexOf(key_field) < 0:
+        raise ValueError(f'{units.name()} layer has no P_Code field "{key_field}"')
+    name = 'States/Regions' if config.level == 'state' else 'Districts'
+    return build_joined_layer(units, result, key_field, PARENT_COLUMN, name=name)
+
+
+def dissolved_path(township_path, pcode_shp, parent_field, prefix, key_field, name_col):
+    settings = short_hash(pcode_shp, parent_field, prefix, key_field, name_col)
+    return cache_dir('dissolved') / f'{content_hash(*dataset_files(township_path))[:20]}_{settings}.gpkg'
+
+
+def dissolved_layer(township_layer, township_path, pcode_shp, parents, parent_field, prefix, key_field, name_col):
+    """District polygons dissolved from the townships, generated once per dataset"""
+    gpkg = dissolved_path(township_path, pcode_shp, parent_field, prefix, key_field, name_col)
+    with _lock:
+        if not gpkg.exists():
+            _dissolve(township_layer, pcode_shp, parents, gpkg, key_field, name_col)
+    layer = QgsVectorLayer(f'{gpkg}|layername={GPKG_LAYER}', 'Districts', 'ogr')
+    if not layer.isValid():
+        raise ValueError(f'Could not read dissolved districts: {gpkg}')
+    return layer
+
+
+def _dissolve(township_layer, pcode_shp, parents, gpkg, key_field, name_col):
+    """Union the township geometries per parent into a GeoPackage"""
+    parent_of = dict(zip(parents['_key'], parents['_parent']))
+    names = dict(zip(parents['_parent'], parents['_name'])) if '_name' in parents.columns else {}
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes([pcode_shp], township_layer.fields())
+    geometries = {}
+    for feature in township_layer.getFeatures(request):
+        if feature.hasGeometry():
+            parent = parent_of[normalize_pcode(feature[pcode_shp])]
+            geometries.setdefault(parent, []).append(feature.geometry())
+
+    fields = QgsFields()
+    fields.append(QgsField(key_field, QVariant.String))
+    if names:
+        fields.append(QgsField(name_col, QVariant.String))
+    layer = QgsMemoryProviderUtils.createMemoryLayer(
+        'Districts', fields, QgsWkbTypes.MultiPolygon, township_layer.crs()
+    )
+    features = []
+    for parent, parts in sorted(geometries.items()):
+        feature = QgsFeature(fields)
+        geometry = QgsGeometry.unaryUnion(parts)
+        geometry.convertToMultiType()
+        feature.setGeometry(geometry)
+        feature.setAttributes([parent] + ([str(names[parent])] if names else []))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+
+    atomic_write(gpkg, lambda tmp: save_layer_to_gpkg(layer, tmp, GPKG_LAYER))
@@ -0,0 +1,130 @@
+"""
+Myanmar Map Generator - Per-state atlas
+
+One map per State/Region from the same build: a QgsLayoutAtlas with the
+state layer as coverage drives the map frame, townships are clipped to
+the current state and the legend only lists the categories on the page.
+Pages are rendered one after another: layouts over the project's layers
+are not safe to render from several threads.
+"""
+
+from pathlib import Path
+import re
+
+from qgis.core import QgsExpression, QgsLayoutItemLabel, QgsLayoutItemLegend, QgsLayoutItemMap
+
+from .map_aggregate import LEVELS
+from .map_export import export_target
+from .map_metrics import noop, stage
+from .map_pipeline import build_layout, find_map_item
+
+
+ATLAS_MARGIN = 0.05
+
+_PLACEHOLDER = re.compile(r'(\{title\}|\{state\})')
+
+
+def state_name_expression(state_layer, field_name):
+    """Expression for the state name, or the feature id when the field is missing"""
+    if field_name and state_layer.fields().indexOf(field_name) >= 0:
+        return QgsExpression.quotedColumnRef(field_name)
+    return '@atlas_featureid'
+
+
+def state_key_expression(state_layer):
+    """Expression for the state P_Code, or the atlas page number when the layer has none"""
+    field_name = LEVELS['state'][0]
+    if state_layer.fields().indexOf(field_name) >= 0:
+        return QgsExpression.quotedColumnRef(field_name)
+    return '@atlas_featurenumber'
+
+
+def filename_expression(template, title, name_expression, key_expression='@atlas_featurenumber'):
+    """Atlas filename expression for a template with {title} and {state} placeholders
+
+    {state} is the state name followed by its key (P_Code or page number),
+    as names that differ only in non-ASCII characters or punctuation
+    would otherwise give the same file name.
+    """
+    terms = []
+    for part in _PLACEHOLDER.split(template):
+        if part == '{title}':
+            terms.append(QgsExpression.quotedString(title.replace(' ', '_')))
+        elif part == '{state}':
+            terms.append(f"regexp_replace(to_string({name_expression}) || '_' || to_string({key_expression}), "
+                         f"'[^A-Za-z0-9_-]+', '_')")
+        elif part:
+            terms.append(QgsExpression.quotedString(part))
+    return ' || '.join(terms) or "'page_' || @atlas_featurenumber"
+
+
+def atlas_layout(build, project):
+    """Layout whose atlas renders one page per feature of the state layer"""
+    config = build.config
+    layout = build_layout(project, config.title, config.page_size, build.township_layer, build.state_layer)
+    layout.setName(f'{config.title} (atlas)')
+    name_expression = state_name_expression(build.state_layer, config.atlas_field)
+
+    atlas = layout.atlas()
+    atlas.setCoverageLayer(build.state_layer)
+    atlas.setHideCoverage(False)
+    atlas.setSortFeatures(True)
+    atlas.setSortExpression(name_expression)
+    atlas.setFilenameExpression(filename_expression(
+        config.atlas_filename, config.title, name_expression, state_key_expression(build.state_layer)
+    ))
+    atlas.setEnabled(True)
+
+    map_item = find_map_item(layout)
+    map_item.setAtlasDriven(True)
+    map_item.setAtlasScalingMode(QgsLayoutItemMap.Auto)
+    map_item.setAtlasMargin(ATLAS_MARGIN)
+
+    # Only the townships are clipped; neighbouring state outlines stay as context
+    clipping = map_item.atlasClippingSettings()
+    clipping.setEnabled(True)
+    clipping.setRestrictToLayers(True)
+    clipping.setLayersToClip([build.township_layer])
+
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemLabel):
+            item.setText(f'{config.title} - [% {name_expression} %]')
+        elif isinstance(item, QgsLayoutItemLegend):
+            item.setLegendFilterByMapEnabled(True)
+    return layout
+
+
+def atlas_kinds(config):
+    return [kind for kind, wanted in (('png', config.export_png), ('pdf', config.export_pdf)) if wanted]
+
+
+def export_atlas(layout, config, progress=None, is_canceled=None, metrics=None):
+    """Render every atlas page to the config's formats; returns the paths, or None if cancelled
+
+    The layout should come from atlas_layout.
+    """
+    progress = progress or noop
+    is_canceled = is_canceled or noop
+    kinds = atlas_kinds(config)
+    count = layout.atlas().updateFeatures()
+    if not count or not kinds:
+        return []
+
+    atlas = layout.atlas()
+    outputs = []
+    with stage(metrics, 'atlas', pages=count):
+        atlas.beginRender()
+        try:
+            for page in range(count):
+                if is_canceled() or not atlas.seekTo(page):
+                    return None
+                base = Path(config.output_path) / atlas.currentFilename()
+                for kind in kinds:
+                    path = f'{base}.{kind}'
+                    if not export_target(layout, kind, path, config.dpi, is_canceled):
+                        return None
+                    outputs.append(path)
+                progress(100 * (page + 1) / count)
+        finally:
+            atlas.endRender()
+    return sorted(outputs)
@@ -0,0 +1,133 @@
+"""
+Myanmar Map Generator - Static basemap cache
+
+The state boundaries (and any other layer marked static) look the same
+in every run. For raster exports they are rendered once per extent,
+frame size and DPI into a transparent, georeferenced PNG in the plugin
+cache, and the map frame draws that image in their place, so repeated
+exports at the same framing only render the thematic layer and labels.
+"""
+
+from pathlib import Path
+import os
+
+from qgis.PyQt.QtCore import QSize, QSizeF, Qt
+from qgis.PyQt.QtGui import QColor, QImage, QPainter
+from qgis.core import (
+    QgsMapRendererCustomPainterJob, QgsMapSettings, QgsProviderRegistry, QgsRasterLayer, QgsRectangle
+)
+
+from .cache_utils import atomic_write, cache_dir, content_hash, dataset_files, prune_cache, short_hash
+from .map_export import STRIP_BYTES, PngWriter
+from .map_pipeline import is_static_layer
+
+
+MAX_BASEMAPS = 32
+
+
+def layer_fingerprint(layer):
+    """Identity of a layer's data and style, or None if it has no source file"""
+    parts = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source())
+    path = parts.get('path')
+    if not path or not os.path.exists(path):
+        return None
+    renderer = layer.renderer()
+    return (content_hash(*dataset_files(path)), parts.get('layerName'), layer.subsetString(),
+            renderer.dump() if renderer else '', layer.opacity(), layer.crs().authid())
+
+
+def basemap_settings(map_item, layers, dpi):
+    """Map settings rendering layers into the map frame's pixel grid at dpi"""
+    rect = map_item.rect()
+    size = QSizeF(round(rect.width() / 25.4 * dpi), round(rect.height() / 25.4 * dpi))
+    settings = map_item.mapSettings(map_item.extent(), size, dpi, True)
+    settings.setLayers(layers)
+    settings.setBackgroundColor(QColor(0, 0, 0, 0))
+    settings.setFlag(QgsMapSettings.DrawLabeling, False)
+    return settings
+
+
+def basemap_key(settings, fingerprints):
+    extent = settings.visibleExtent()
+    size = settings.outputSize()
+    return short_hash(fingerprints, extent.toString(6), size.width(), size.height(),
+                      settings.outputDpi(), settings.destinationCrs().authid())
+
+
+def render_basemap(settings, path):
+    """Render settings into a transparent PNG with a world file, strip by strip"""
+    width, height = settings.outputSize().width(), settings.outputSize().height()
+    extent = settings.visibleExtent()
+    unit_x = extent.width() / width
+    unit_y = extent.height() / height
+    rows = max(1, STRIP_BYTES // (width * 4))
+
+    # Written under temporary names, so concurrent runs never read half a file;
+    # the world file is in place before the image
+    path = Path(path)
+
+    def write(tmp):
+        with PngWriter(tmp, width, height, settings.outputDpi()) as png:
+            for top in range(0, height, rows):
+                count = min(rows, height - top)
+                strip = QgsMapSettings(settings)
+                strip.setOutputSize(QSize(width, count))
+                strip.setExtent(QgsRectangle(extent.xMinimum(), extent.yMaximum() - (top + count) * unit_y,
+                                             extent.xMaximum(), extent.yMaximum() - top * unit_y))
+                image = QImage(width, count, QImage.Format_ARGB32_Premultiplied)
+                image.fill(Qt.transparent)
+                painter = QPainter(image)
+                QgsMapRendererCustomPainterJob(strip, painter).renderSynchronously()
+                painter.end()
+                png.write_image(image)
+        atomic_write(path.with_suffix('.pgw'), '\n'.join(str(v) for v in (
+            unit_x, 0.0, 0.0, -unit_y,
+            extent.xMinimum() + unit_x / 2, extent.yMaximum() - unit_y / 2,
+        )) + '\n')
+
+    atomic_write(path, write)
+
+
+def basemap_layer(map_item, layers, dpi, record=None):
+    """Cached raster of the static layers for the map frame, or None if not cacheable"""
+    fingerprints = [layer_fingerprint(layer) for layer in layers]
+    if not layers or None in fingerprints:
+        return None
+    settings = basemap_settings(map_item, layers, dpi)
+    folder = cache_dir('basemap')
+    path = folder / f'{basemap_key(settings, fingerprints)}.png'
+    cached = path.exists()
+    if cached:
+        path.touch()
+    else:
+        render_basemap(settings, path)
+        prune_cache(folder, '*.png', MAX_BASEMAPS, companions=('.pgw',))
+    if record is not None:
+        record['cached'] = cached
+
+    layer = QgsRasterLayer(str(path), 'Static layers', 'gdal')
+    if not layer.isValid():
+        return None
+    layer.setCrs(settings.destinationCrs())
+    return layer
+
+
+def with_basemap(map_item, layers, dpi, record=None):
+    """Layers with the static ones replaced by one cached raster
+
+    The raster takes the place of the topmost static layer, so the
+    drawing order is unchanged. Returns the layers as they are when
+    there is nothing to cache.
+    """
+    static = [layer for layer in layers if is_static_layer(layer)]
+    raster = basemap_layer(map_item, static, dpi, record)
+    if raster is None:
+        return layers
+    result = []
+    for layer in layers:
+        if layer is static[0]:
+            result.append(raster)
+        elif layer not in static:
+            result.append(layer)
+    return result
+
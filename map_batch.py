@@ -0,0 +1,310 @@
+"""
+Myanmar Map Generator - Batch map generation
+
+A batch is a list of (sheet, category column, label column, title) jobs
+that share one set of layers and one workbook. The layers and data are
+loaded once, joined once per sheet, and the exports are rendered by a
+pool of headless QGIS worker processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from qgis.core import QgsApplication, QgsFeatureRequest, QgsProject, QgsVectorLayer
+
+from .cache_utils import cache_dir
+from .data_loader import list_sheets, load_table, resolve_sheet, sheet_key
+from .map_core import (
+    MapBuild, add_to_project, apply_generalization, create_layout, output_groups, output_targets, start_qgis,
+    style_layers, uses_generalization
+)
+from .map_aggregate import aggregated_layer, aggregation_columns, config_aggregations
+from .map_atlas import atlas_layout, export_atlas
+from .map_export import export_all
+from .map_generalize import ExportGeneralization, generalized_layer, output_tolerance
+from .map_join import build_joined_layer
+from .map_labels import apply_label_anchors
+from .map_pipeline import load_layers, save_layer_to_gpkg
+from .output_cache import OutputCache
+from .pcode_match import apply_fuzzy_match
+from .web_export import export_web
+
+
+MANIFEST_NAME = 'batch_manifest.json'
+
+
+@dataclass
+class BatchJob:
+    """One map of a batch run"""
+    category_col: str
+    title: str
+    label_col: str = ''
+    sheet: object = None
+
+
+def load_jobs(path):
+    """Read batch jobs from a JSON list or a CSV file with a header row"""
+    path = Path(path)
+    if path.suffix.lower() == '.json':
+        rows = json.loads(path.read_text(encoding='utf-8'))
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+
+    jobs = []
+    for row in rows:
+        sheet = row.get('sheet')
+        if isinstance(sheet, str):
+            sheet = sheet.strip() or None
+        jobs.append(BatchJob(
+            category_col=row['category_col'],
+            title=row.get('title') or row['category_col'],
+            label_col=row.get('label_col') or '',
+            sheet=sheet,
+        ))
+    return jobs
+
+
+def run_batch(config, jobs, workers=None, progress=None, is_canceled=None):
+    """Generate one map per job and write a manifest next to the outputs
+
+    config holds the MapConfig values shared by every job (paths, P_Code
+    columns, colours, label and page settings); each job overrides the
+    sheet, category column, label column and title. Jobs whose outputs
+    are up to date (config.reuse_outputs) are marked 'skipped'. Returns
+    the manifest dict, or None if cancelled.
+    """
+    progress = progress or (lambda value: None)
+    is_canceled = is_canceled or (lambda: False)
+    output_folder = Path(config.output_path)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    timings = {}
+    work_dir = Path(tempfile.mkdtemp(prefix='batch_', dir=cache_dir()))
+
+    try:
+        # Layers and data are loaded once for the whole batch
+        start = time.perf_counter()
+        state_layer, source_layer = load_layers(config.state_path, config.township_path)
+        timings['load_layers'] = time.perf_counter() - start
+
+        # Fill the generalization cache once here, so workers only read it
+        if uses_generalization(config):
+            start = time.perf_counter()
+            tolerance = output_tolerance(source_layer.extent(), config.page_size, config.dpi)
+            generalized_layer(config.township_path, tolerance, 'Townships')
+            generalized_layer(config.state_path, tolerance, 'States')
+            timings['generalize'] = time.perf_counter() - start
+
+        # Jobs whose outputs are all up to date are not loaded or rendered
+        cache = OutputCache(output_folder) if config.reuse_outputs else None
+        results = [None] * len(jobs)
+        sheets = {}
+        sheet_names = None
+        for index, job in enumerate(jobs):
+            if job.sheet is None:
+                sheet = sheet_key(config.sheet)
+            else:
+                if sheet_names is None and isinstance(job.sheet, str):
+                    sheet_names = list_sheets(config.excel_path)
+                sheet = resolve_sheet(job.sheet, sheet_names or [])
+            job_config = config.replace(sheet=str(sheet), category_col=job.category_col, title=job.title,
+                                        label_col=job.label_col or config.label_col)
+            targets = output_targets(job_config)
+            stale = cache.stale_targets(job_config, targets) if cache else targets
+            # Batch jobs export the atlas and the web map, not series
+            groups = [group for group in output_groups(job_config) if group != 'series']
+            reused = {group: cache.group_outputs(job_config, group) for group in groups} if cache else {}
+            stale_groups = [group for group in groups if reused.get(group) is None]
+            if not stale and not stale_groups:
+                outputs = [path for _, path in targets] + [p for group in groups for p in reused[group]]
+                results[index] = dict(asdict(job), status='skipped', error=None, outputs=outputs, timings={})
+                continue
+            sheets.setdefault(sheet, []).append({
+                'index': index,
+                'job': asdict(job),
+                'config': job_config,
+                'targets': stale,
+                'groups': stale_groups,
+            })
+
+        payloads = []
+        join_reports = {}
+        timings['load_data'] = timings['join'] = 0.0
+        for n, (sheet, sheet_payloads) in enumerate(sheets.items()):
+            if is_canceled():
+                return None
+
+            columns = [config.pcode_excel, config.township_col]
+            aggregations = []
+            for payload in sheet_payloads:
+                columns += [payload['config'].category_col, payload['config'].label_col]
+                if config.level != 'township':
+                    aggregations += config_aggregations(payload['config'])
+            columns += aggregation_columns(aggregations)
+
+            start = time.perf_counter()
+            df = load_table(config.excel_path, columns=list(dict.fromkeys(columns)), sheet_name=sheet)
+            timings['load_data'] += time.perf_counter() - start
+
+            # One joined (or rolled-up) layer per sheet, reused by all of its jobs
+            start = time.perf_counter()
+            df, suggestions = apply_fuzzy_match(config, source_layer, df)
+            joined, report = build_joined_layer(source_layer, df, config.pcode_shp, config.pcode_excel)
+            report.suggestions = suggestions
+            join_reports[str(sheet)] = report.to_dict()
+            if aggregations:
+                joined, _ = aggregated_layer(config, source_layer, state_layer, df, aggregations)
+            apply_label_anchors(config, source_layer, joined)
+            gpkg_path = work_dir / f'sheet_{n}.gpkg'
+            save_layer_to_gpkg(joined, gpkg_path, 'townships')
+            timings['join'] += time.perf_counter() - start
+
+            for payload in sheet_payloads:
+                payload['township_source'] = f'{gpkg_path}|layername=townships'
+                payloads.append(payload)
+
+        progress(10)
+        start = time.perf_counter()
+        rendered = _render_all(payloads, workers, progress, is_canceled)
+        timings['render'] = time.perf_counter() - start
+        if rendered is None:
+            return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Workers run in other processes, so only this one writes the output manifest
+    for payload, result in zip(payloads, rendered):
+        results[payload['index']] = result
+        group_outputs = result.pop('groups', {})
+        if cache and result['status'] == 'ok':
+            cache.record_targets(payload['config'], payload['targets'])
+            for group, paths in group_outputs.items():
+                cache.record_group(payload['config'], group, paths)
+
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'excel_path': config.excel_path,
+        'workers': _worker_count(workers, len(payloads)),
+        'timings': timings,
+        'join_reports': join_reports,
+        'jobs': results,
+    }
+    manifest_path = output_folder / MANIFEST_NAME
+    manifest_path.write_text(json.dumps(manifest, indent=2, default=str), encoding='utf-8')
+    manifest['path'] = str(manifest_path)
+    progress(100)
+    return manifest
+
+
+def _worker_count(workers, job_count):
+    workers = workers or os.cpu_count() or 1
+    return max(1, min(workers, job_count))
+
+
+def _python_executable():
+    """Python interpreter for worker processes (sys.executable is QGIS itself in the desktop app)"""
+    exe = Path(sys.executable)
+    if exe.name.lower().startswith('python'):
+        return str(exe)
+    prefix = Path(sys.exec_prefix)
+    for candidate in (prefix / 'python.exe', prefix / 'python3.exe',
+                      prefix / 'bin' / 'python3', prefix / 'bin' / 'python'):
+        if candidate.exists():
+            return str(candidate)
+    return shutil.which('python3') or shutil.which('python')
+
+
+def _render_all(payloads, workers, progress, is_canceled):
+    """Render every payload, in worker processes when more than one is useful"""
+    workers = _worker_count(workers, len(payloads))
+    python = _python_executable()
+    results = [None] * len(payloads)
+
+    if workers == 1 or python is None:
+        for i, payload in enumerate(payloads):
+            if is_canceled():
+                return None
+            results[i] = _render_job(payload)
+            progress(10 + 90 * (i + 1) / len(payloads))
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(QgsApplication.prefixPath(),)) as executor:
+        futures = {executor.submit(_render_job, payload): i for i, payload in enumerate(payloads)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            if is_canceled():
+                for pending in futures:
+                    pending.cancel()
+                return None
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = dict(payloads[i]['job'], status='failed', error=str(e), outputs=[], timings={})
+            progress(10 + 90 * done / len(payloads))
+    return results
+
+
+_qgs_app = None
+
+
+def _init_worker(prefix_path):
+    """Start a headless QGIS application in a worker process"""
+    global _qgs_app
+    _qgs_app = start_qgis(prefix_path)
+
+
+def _render_job(payload):
+    """Style and export one job; runs in a worker process or in-process"""
+    config = payload['config']
+    timings = {}
+    result = dict(payload['job'], status='ok', error=None, outputs=[], timings=timings, pid=os.getpid(), groups={})
+    project = QgsProject()
+    try:
+        start = time.perf_counter()
+        source = QgsVectorLayer(payload['township_source'], 'Townships', 'ogr')
+        township_layer = source.materialize(QgsFeatureRequest())
+        township_layer.setName('Townships')
+        state_layer = QgsVectorLayer(config.state_path, 'States', 'ogr')
+        timings['load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        renderer, labeling = style_layers(config, state_layer, township_layer)
+        build = MapBuild(config, state_layer, township_layer, renderer, labeling)
+        add_to_project(build, project)
+        layout = create_layout(build, project)
+        if uses_generalization(config):
+            apply_generalization(layout, ExportGeneralization(build))
+        timings['style'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result['outputs'] = export_all(layout, payload['targets'], config.dpi)
+        timings['export'] = time.perf_counter() - start
+
+        for group in payload['groups']:
+            start = time.perf_counter()
+            if group == 'atlas':
+                paths = export_atlas(atlas_layout(build, project), config)
+            else:
+                paths = export_web(build)
+            result['groups'][group] = paths
+            result['outputs'] += paths
+            timings[group] = time.perf_counter() - start
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+    finally:
+        project.clear()
+    return result
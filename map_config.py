@@ -0,0 +1,77 @@
+"""
+Myanmar Map Generator - Map configuration
+"""
+
+from dataclasses import dataclass, asdict, fields, replace
+from pathlib import Path
+import json
+
+
+@dataclass
+class MapConfig:
+    """Everything needed to build and export one map, without any widgets"""
+    state_path: str = ''
+    township_path: str = ''
+    excel_path: str = ''
+    sheet: str = ''
+    pcode_shp: str = 'TS_PCODE'
+    pcode_excel: str = 'TS_Pcode'
+    name_shp: str = 'TS'
+    fuzzy_match: bool = True
+    match_threshold: float = 0.85
+    category_col: str = 'Thematic25'
+    township_col: str = 'Township'
+    label_col: str = 'IP_25'
+    multi_color: bool = True
+    data_color: str = '#1abc9c'
+    no_data_color: str = '#f0f0f0'
+    show_counts: bool = False
+    title: str = 'Myanmar Coverage Map 2025'
+    show_labels: bool = True
+    label_size: int = 7
+    label_anchors: bool = True
+    label_candidates: float = 2.5
+    label_obstacles: bool = False
+    label_priority: int = 5
+    page_size: str = 'A4'
+    dpi: int = 300
+    generalize: bool = True
+    level: str = 'township'
+    parent_field: str = ''
+    parent_prefix: int = 0
+    district_path: str = ''
+    unit_pcode: str = ''
+    unit_name_col: str = ''
+    aggregations: str = ''
+    output_path: str = ''
+    export_png: bool = True
+    export_pdf: bool = True
+    reuse_outputs: bool = True
+    atlas: bool = False
+    atlas_field: str = 'ST'
+    atlas_filename: str = '{title}_{state}'
+    series: str = ''
+    export_gif: bool = True
+    export_mp4: bool = False
+    frame_seconds: float = 1.0
+    export_web: bool = False
+    web_format: str = 'topojson'
+    web_tolerance: float = 0.0005
+    profile: bool = False
+
+    @classmethod
+    def from_dict(cls, values):
+        """Build a config from a dict, ignoring unknown keys"""
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in values.items() if k in known})
+
+    @classmethod
+    def from_json(cls, path):
+        return cls.from_dict(json.loads(Path(path).read_text(encoding='utf-8')))
+
+    def to_dict(self):
+        return asdict(self)
+
+    def replace(self, **changes):
+        """Copy of this config with some values changed"""
+        return replace(self, **changes)
@@ -0,0 +1,287 @@
+"""
+Myanmar Map Generator - Headless core API
+
+The functions here take a MapConfig and never touch widgets, so the same
+pipeline runs from the dialog, from background tasks, from batch workers
+and from the command line.
+"""
+
+from qgis.core import QgsApplication, QgsProject, QgsVectorSimplifyMethod
+import os
+
+from .data_loader import load_table, sheet_key
+from .map_aggregate import aggregated_layer, aggregation_columns, config_aggregations
+from .map_atlas import atlas_layout, export_atlas
+from .map_export import export_all
+from .map_generalize import ExportGeneralization, uses_generalization
+from .map_join import build_joined_layer
+from .map_labels import apply_label_anchors, apply_labeling_engine, config_labeling
+from .map_metrics import RunMetrics, noop, stage
+from .map_pipeline import (
+    load_layers, style_state_layer, build_renderer, category_counts,
+    build_layout, export_targets, find_map_item
+)
+from .map_timeseries import SeriesExport, export_series
+from .output_cache import OutputCache
+from .pcode_match import apply_fuzzy_match
+from .web_export import export_web
+
+
+class MapBuild:
+    """Layers, renderer and labeling produced by build_map"""
+
+    def __init__(self, config, state_layer, township_layer, renderer, labeling=None, join_report=None,
+                 metrics=None):
+        self.config = config
+        self.state_layer = state_layer
+        self.township_layer = township_layer
+        self.renderer = renderer
+        self.labeling = labeling
+        self.join_report = join_report
+        self.metrics = metrics
+        self._category_counts = {}
+
+    def category_counts(self, category_col):
+        """Feature count per category, cached per column for legends and restyles"""
+        counts = self._category_counts.get(category_col)
+        if counts is None:
+            counts = category_counts(self.township_layer, category_col)
+            self._category_counts[category_col] = counts
+        return counts
+
+    def forget_counts(self):
+        """Drop cached counts after the joined values changed"""
+        self._category_counts.clear()
+
+    def layers(self):
+        return [self.state_layer, self.township_layer]
+
+
+def style_layers(config, state_layer, township_layer, counts=None):
+    """Style the state layer and return the township renderer and labeling"""
+    style_state_layer(state_layer)
+    renderer = build_renderer(
+        township_layer, config.category_col, config.multi_color,
+        config.data_color, config.no_data_color,
+        counts=counts, show_counts=config.show_counts
+    )
+    labeling = None
+    if config.show_labels:
+        labeling = config_labeling(config, township_layer)
+    return renderer, labeling
+
+
+def build_map(config, progress=None, is_canceled=None, metrics=None):
+    """Load, join and style the layers; returns a MapBuild, or None if cancelled
+
+    Stage timings go into metrics (a new RunMetrics unless one is given),
+    which is kept on the returned MapBuild. A run created here is closed
+    when the build fails or is cancelled.
+    """
+    owned = metrics is None
+    metrics = metrics or RunMetrics.for_config(config)
+    build = None
+    try:
+        build = _build_map(config, progress or noop, is_canceled or noop, metrics)
+        return build
+    finally:
+        if build is None and owned:
+            metrics.close()
+
+
+def _build_map(config, progress, is_canceled, metrics):
+    """The stages of build_map()"""
+    # Load the data table (only the columns the map uses)
+    progress(0)
+    aggregated = config.level != 'township'
+    columns = [config.pcode_excel, config.category_col, config.township_col, config.label_col]
+    if aggregated:
+        aggregations = config_aggregations(config)
+        columns += aggregation_columns(aggregations)
+    with metrics.stage('excel_read') as record:
+        df = load_table(config.excel_path, columns=list(dict.fromkeys(columns)), sheet_name=sheet_key(config.sheet))
+        record['rows'] = len(df)
+
+    # Load shapefiles
+    if is_canceled():
+        return None
+    progress(15)
+    with metrics.stage('layer_load') as record:
+        state_layer, source_layer = load_layers(config.state_path, config.township_path)
+        record['features'] = source_layer.featureCount()
+
+    # Join into a memory copy; the source shapefile is never edited
+    if is_canceled():
+        return None
+    progress(30)
+    with metrics.stage('join') as record:
+        df, suggestions = apply_fuzzy_match(config, source_layer, df)
+        township_layer, join_report = build_joined_layer(source_layer, df, config.pcode_shp, config.pcode_excel)
+        join_report.suggestions = suggestions
+        record['matched'] = join_report.matched
+        record['fuzzy_matched'] = sum(s.accepted for s in suggestions)
+
+    # District/state maps draw the rolled-up units in place of the townships
+    if aggregated:
+        with metrics.stage('aggregate', level=config.level) as record:
+            township_layer, unit_report = aggregated_layer(config, source_layer, state_layer, df, aggregations)
+            record['units'] = unit_report.townships
+            record['units_without_data'] = len(unit_report.townships_without_data)
+
+    # Label points inside each polygon, cached per shapefile
+    with metrics.stage('label_anchors') as record:
+        record['anchors'] = apply_label_anchors(config, source_layer, township_layer)
+
+    # Style and labels
+    if is_canceled():
+        return None
+    progress(60)
+    build = MapBuild(config, state_layer, township_layer, None, None, join_report, metrics)
+    with metrics.stage('category_scan') as record:
+        counts = build.category_counts(config.category_col)
+        record['categories'] = len(counts)
+    with metrics.stage('styling'):
+        build.renderer, build.labeling = style_layers(config, state_layer, township_layer, counts=counts)
+
+    progress(100)
+    return build
+
+
+def add_to_project(build, project):
+    """Apply renderer, labels and labeling engine limits and add the layers, states below townships"""
+    township_layer = build.township_layer
+    apply_labeling_engine(build.config, project)
+    township_layer.setRenderer(build.renderer)
+    if build.labeling is not None:
+        township_layer.setLabeling(build.labeling)
+        township_layer.setLabelsEnabled(True)
+
+    # Canvas previews simplify on the fly to one pixel at every zoom level
+    for layer in build.layers():
+        layer.setSimplifyMethod(_preview_simplify_method())
+
+    project.addMapLayer(build.state_layer)
+    project.addMapLayer(township_layer)
+
+
+def _preview_simplify_method():
+    method = QgsVectorSimplifyMethod()
+    method.setSimplifyHints(QgsVectorSimplifyMethod.GeometrySimplification)
+    method.setThreshold(1.0)
+    return method
+
+
+def create_layout(build, project):
+    """Print layout for a build"""
+    return build_layout(
+        project, build.config.title, build.config.page_size,
+        build.township_layer, build.state_layer
+    )
+
+
+def prepare_export(build, project):
+    """Layout for the project plus a clone to export from
+
+    When generalization is on, the returned ExportGeneralization provides
+    simplified stand-ins for the clone's map frame; pass it to
+    export_outputs, which applies it before rendering.
+    """
+    layout = create_layout(build, project)
+    generalization = ExportGeneralization(build) if uses_generalization(build.config) else None
+    return layout, layout.clone(), generalization
+
+
+def apply_generalization(layout, generalization):
+    """Point the layout's map frame at the generalized layers, if available"""
+    if generalization is None:
+        return
+    layers = generalization.layers()
+    if layers:
+        find_map_item(layout).setLayers(layers)
+
+
+def output_targets(config):
+    """List of (kind, path) outputs requested by a config"""
+    return export_targets(config.output_path, config.title, png=config.export_png, pdf=config.export_pdf)
+
+
+def export_outputs(layout, targets, dpi, progress=None, is_canceled=None, generalization=None, metrics=None):
+    """Export a layout to every target; returns the written paths, or None if cancelled"""
+    progress = progress or noop
+    is_canceled = is_canceled or noop
+    if generalization is not None:
+        with stage(metrics, 'generalize'):
+            apply_generalization(layout, generalization)
+    if is_canceled():
+        return None
+    return export_all(layout, targets, dpi, progress=progress, is_canceled=is_canceled, metrics=metrics)
+
+
+def output_groups(config):
+    """Multi-file outputs requested by a config: 'atlas', 'series' and/or 'web'"""
+    wanted = (('atlas', config.atlas), ('series', bool(config.series)), ('web', config.export_web))
+    return [group for group, on in wanted if on]
+
+
+def export_group(group, build, project):
+    """Export the atlas pages, the series frames or the web map of a build synchronously"""
+    if group == 'atlas':
+        return export_atlas(atlas_layout(build, project), build.config, metrics=build.metrics)
+    if group == 'web':
+        return export_web(build, metrics=build.metrics)
+    return export_series(SeriesExport(build, project), metrics=build.metrics)
+
+
+def run_map(config, project=None):
+    """Build and export a map synchronously; returns (written paths, JoinReport)
+
+    With config.reuse_outputs, outputs whose render key is unchanged are
+    kept as they are; if nothing is stale the map is not even built and
+    the JoinReport is None.
+    """
+    targets = output_targets(config)
+    groups = output_groups(config)
+    cache = OutputCache(config.output_path) if config.reuse_outputs else None
+    stale = cache.stale_targets(config, targets) if cache else targets
+    reused = {group: cache.group_outputs(config, group) for group in groups} if cache else {}
+    if not stale and all(reused.get(group) is not None for group in groups):
+        return [path for _, path in targets] + [p for group in groups for p in reused[group]], None
+
+    project = project or QgsProject.instance()
+    project.clear()
+
+    build = build_map(config)
+    with build.metrics:
+        add_to_project(build, project)
+        if stale:
+            _, export_layout, generalization = prepare_export(build, project)
+            export_outputs(export_layout, stale, config.dpi, generalization=generalization, metrics=build.metrics)
+            if cache:
+                cache.record_targets(config, stale)
+        outputs = [path for _, path in targets]
+        for group in groups:
+            paths = reused.get(group)
+            if paths is None:
+                paths = export_group(group, build, project)
+                if cache:
+                    cache.record_group(config, group, paths)
+            outputs += paths
+        build.metrics.finish(outputs=outputs, reused=len(targets) - len(stale))
+    return outputs, build.join_report
+
+
+def start_qgis(prefix_path=None):
+    """Start a headless QgsApplication (no display needed) and return it"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    prefix_path = prefix_path or os.environ.get('QGIS_PREFIX_PATH')
+    if prefix_path:
+        QgsApplication.setPrefixPath(prefix_path, True)
+    app = QgsApplication([], False)
+    app.initQgis()
+
+    # The desktop registers the native processing algorithms; headless runs must do it
+    from qgis.analysis import QgsNativeAlgorithms
+    registry = QgsApplication.processingRegistry()
+    if registry.providerById('native') is None:
+        registry.addProvider(QgsNativeAlgorithms())
+    return app
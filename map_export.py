@@ -0,0 +1,323 @@
+"""
+Myanmar Map Generator - Export pipeline
+
+Labels are placed once per export: the labeling engine runs a single
+time on the map frame, and the placed labels are turned into a point
+layer that every output draws as-is. PNGs draw the state boundaries
+from a cached pre-rendered image (see map_basemap). PNG and PDF are then
+rendered one after another, and very large PNGs are rendered in
+horizontal strips that are streamed into the file, so memory use does
+not grow with DPI or page size.
+"""
+
+from pathlib import Path
+import struct
+import zlib
+
+from qgis.PyQt.QtCore import QRectF, QSize, QSizeF, QVariant
+from qgis.PyQt.QtGui import QImage, QPainter
+from qgis.core import (
+    QgsFeature, QgsFeatureRequest, QgsField, QgsFields, QgsGeometry, QgsLayoutExporter,
+    QgsMapRendererCustomPainterJob, QgsMapSettings, QgsMemoryProviderUtils, QgsNullSymbolRenderer,
+    QgsPalLayerSettings, QgsPointXY, QgsVectorLayer, QgsVectorLayerSimpleLabeling, QgsWkbTypes
+)
+
+from .cache_utils import atomic_write, remove_file
+from .map_labels import cached_placements, placement_key, store_placements
+from .map_metrics import noop, stage
+from .map_pipeline import export_layout, find_map_item
+
+
+# PNGs whose page image would exceed this are rendered in strips. Every
+# strip renders the whole layout again, so the limit leaves A4 and A3 at
+# 300 DPI (A3: ~67 MB) and A4 at 600 DPI in one piece, and strips are
+# large so that bigger pages need only a few renders.
+MAX_IMAGE_BYTES = 160 * 2**20
+STRIP_BYTES = 64 * 2**20
+
+LABEL_FIELD = 'label'
+
+
+def export_all(layout, targets, dpi, progress=None, is_canceled=None, metrics=None):
+    """Export a layout to every (kind, path) target; returns the paths, or None if cancelled
+
+    The layout's map frame must already show the layers to export
+    (see map_core.apply_generalization).
+    """
+    progress = progress or noop
+    is_canceled = is_canceled or noop
+    if not targets:
+        return []
+
+    # map_basemap renders with PngWriter from this module
+    from .map_basemap import with_basemap
+
+    map_item = find_map_item(layout)
+    with stage(metrics, 'labeling'):
+        layers = fixed_label_layers(map_item, dpi) or map_item.layers()
+
+    # Raster outputs draw the static layers from the basemap cache; PDFs keep them as vectors
+    raster_layers = layers
+    if any(kind == 'png' for kind, _ in targets):
+        with stage(metrics, 'basemap') as record:
+            raster_layers = with_basemap(map_item, layers, dpi, record)
+
+    # Targets are exported one after another on this thread: layouts over
+    # the project's layers are not safe to render from several threads
+    outputs = []
+    for done, (kind, path) in enumerate(targets, start=1):
+        map_item.setLayers(raster_layers if kind == 'png' else layers)
+        if is_canceled() or not export_target(layout, kind, path, dpi, is_canceled, metrics):
+            return None
+        outputs.append(path)
+        progress(100 * done / len(targets))
+    return outputs
+
+
+def export_target(layout, kind, path, dpi, is_canceled=None, metrics=None):
+    """Export one target, streaming large PNGs in strips; False if cancelled
+
+    The file is written under a temporary name and moved into place when
+    complete, so an interrupted export never leaves a partial output.
+    """
+    def write(tmp):
+        with stage(metrics, f'{kind}_export') as record:
+            if kind == 'png' and page_image_bytes(layout, dpi) > MAX_IMAGE_BYTES:
+                record['tiled'] = True
+                return export_png_tiled(layout, tmp, dpi, is_canceled=is_canceled)
+            export_layout(layout, kind, str(tmp), dpi)
+
+    return atomic_write(path, write)
+
+
+def page_pixels(layout, dpi):
+    """Pixel width and height of the first page at dpi"""
+    rect = layout.pageCollection().page(0).rect()
+    return round(rect.width() / 25.4 * dpi), round(rect.height() / 25.4 * dpi)
+
+
+def page_image_bytes(layout, dpi):
+    width, height = page_pixels(layout, dpi)
+    return width * height * 4
+
+
+def export_png_tiled(layout, path, dpi, strip_bytes=STRIP_BYTES, is_canceled=None):
+    """Render the first page in horizontal strips and stream them into a PNG
+
+    Only one strip is held in memory at a time. Strip edges fall on whole
+    pixel rows, so the strips join without seams. Returns False (and
+    removes the partial file) if cancelled.
+    """
+    is_canceled = is_canceled or noop
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    page = layout.pageCollection().page(0)
+    origin = page.pos()
+    width_mm = page.rect().width()
+    width, height = page_pixels(layout, dpi)
+    rows = max(1, strip_bytes // (width * 4))
+    mm_per_pixel = 25.4 / dpi
+
+    exporter = QgsLayoutExporter(layout)
+    with PngWriter(path, width, height, dpi) as png:
+        for top in range(0, height, rows):
+            if is_canceled():
+                png.abort()
+                return False
+            count = min(rows, height - top)
+            region = QRectF(origin.x(), origin.y() + top * mm_per_pixel, width_mm, count * mm_per_pixel)
+            png.write_image(exporter.renderRegionToImage(region, QSize(width, count), dpi))
+    return True
+
+
+class PngWriter:
+    """Minimal streaming PNG encoder (8-bit RGBA, no interlacing)
+
+    Rows are deflated as they arrive and written out in IDAT chunks, so
+    the full image never has to exist in memory.
+    """
+
+    def __init__(self, path, width, height, dpi=None):
+        self.path = Path(path)
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(6)
+        self._file = open(self.path, 'wb')
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        if dpi:
+            ppm = round(dpi / 0.0254)
+            self._chunk(b'pHYs', struct.pack('>IIB', ppm, ppm, 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file is None:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write_image(self, image):
+        """Append the rows of a QImage as wide as the PNG"""
+        image = image.convertToFormat(QImage.Format_RGBA8888)
+        stride = image.bytesPerLine()
+        row_bytes = self.width * 4
+        bits = image.constBits()
+        bits.setsize(stride * image.height())
+        data = bits.asstring()
+        out = bytearray()
+        for y in range(image.height()):
+            out += b'\x00'
+            out += data[y * stride:y * stride + row_bytes]
+        self.rows_written += image.height()
+        self._write_idat(self._compressor.compress(bytes(out)))
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f'PNG expected {self.height} rows, got {self.rows_written}')
+        self._write_idat(self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._file.close()
+        self._file = None
+
+    def abort(self):
+        """Close and delete a partially written file"""
+        self._file.close()
+        self._file = None
+        remove_file(self.path)
+
+    def _write_idat(self, data):
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def fixed_label_layers(map_item, dpi):
+    """Map layers with the label placement done once, or None to keep them
+
+    Runs the labeling engine a single time for the map frame at the export
+    resolution. Labeled layers are replaced by unlabeled copies, and the
+    placed labels go into a point layer on top that draws each label at
+    its computed position, so every output shows identical labels without
+    searching for placements again.
+    """
+    layers = map_item.layers()
+    labeled = [layer for layer in layers if _simple_labels(layer) is not None]
+    if not labeled:
+        return None
+    positions = placed_labels(map_item, labeled, dpi)
+    if positions is None:
+        return None
+
+    # Label layers are drawn above every map layer
+    label_layers, map_layers = [], []
+    for layer in layers:
+        if layer in labeled:
+            label_layers.append(label_point_layer(layer, positions.get(layer.id(), []), map_item.crs()))
+            map_layers.append(unlabeled_copy(layer))
+        else:
+            map_layers.append(layer)
+    return label_layers + map_layers
+
+
+def placed_labels(map_item, layers, dpi):
+    """Placed labels per layer id from one labeling run, or None
+
+    Each label is an (x, y, text) tuple with the centre of the label in
+    map units of the map frame's CRS (map_item.crs()), not the layer's.
+    Results are cached per labeled data, framing and DPI (see
+    map_labels), so the engine only runs for a new combination.
+    """
+    rect = map_item.rect()
+    size = QSizeF(rect.width() / 25.4 * dpi, rect.height() / 25.4 * dpi)
+    settings = map_item.mapSettings(map_item.extent(), size, dpi, True)
+    settings.setLayers(layers)
+    settings.setFlag(QgsMapSettings.DrawLabeling, True)
+    skip_symbols = getattr(QgsMapSettings, 'SkipSymbolRendering', None)
+    if skip_symbols is not None:
+        settings.setFlag(skip_symbols, True)
+
+    key = placement_key(settings, layers)
+    placements = cached_placements(key)
+    if placements is not None:
+        return {layer.id(): labels for layer, labels in zip(layers, placements)}
+
+    # Placement happens in map units; the painter only receives the output
+    image = QImage(1, 1, QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    job = QgsMapRendererCustomPainterJob(settings, painter)
+    job.renderSynchronously()
+    painter.end()
+    results = job.takeLabelingResults()
+    if results is None:
+        return None
+
+    positions = {}
+    for position in results.labelsWithinRect(settings.visibleExtent()):
+        if position.isDiagram or getattr(position, 'isUnplaced', False):
+            continue
+        center = position.labelRect.center()
+        positions.setdefault(position.layerID, []).append((center.x(), center.y(), position.labelText))
+    store_placements(key, [positions.get(layer.id(), []) for layer in layers])
+    return positions
+
+
+def _simple_labels(layer):
+    """Label settings of a layer with single-rule labeling, else None"""
+    if not isinstance(layer, QgsVectorLayer) or not layer.labelsEnabled():
+        return None
+    labeling = layer.labeling()
+    if not isinstance(labeling, QgsVectorLayerSimpleLabeling):
+        return None
+    return labeling.settings()
+
+
+def label_point_layer(layer, positions, crs):
+    """Point layer drawing each placed (x, y, text) label centred on its position
+
+    positions are in crs, the destination CRS of the labeling run.
+    """
+    fields = QgsFields()
+    fields.append(QgsField(LABEL_FIELD, QVariant.String))
+    points = QgsMemoryProviderUtils.createMemoryLayer(
+        f'{layer.name()} labels', fields, QgsWkbTypes.Point, crs
+    )
+    features = []
+    for x, y, text in positions:
+        feature = QgsFeature(fields)
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        feature.setAttribute(0, text)
+        features.append(feature)
+    points.dataProvider().addFeatures(features)
+
+    settings = QgsPalLayerSettings(_simple_labels(layer))
+    settings.fieldName = LABEL_FIELD
+    settings.isExpression = False
+    settings.geometryGeneratorEnabled = False
+    settings.placement = QgsPalLayerSettings.OverPoint
+    settings.quadOffset = QgsPalLayerSettings.QuadrantOver
+    settings.displayAll = True
+    points.setLabeling(QgsVectorLayerSimpleLabeling(settings))
+    points.setLabelsEnabled(True)
+
+    # Only the labels are drawn, not the points
+    points.setRenderer(QgsNullSymbolRenderer())
+    return points
+
+
+def unlabeled_copy(layer):
+    """Memory copy of a layer with its renderer and without labels"""
+    copy = layer.materialize(QgsFeatureRequest())
+    copy.setName(layer.name())
+    copy.setRenderer(layer.renderer().clone())
+    copy.setLabelsEnabled(False)
+    return copy
@@ -0,0 +1,163 @@
+"""
+Myanmar Map Generator - Scale-aware geometry generalization
+
+At A4/A3 page sizes most vertices of the 1:250k boundaries are smaller
+than one output pixel. Before an export, both layers are swapped for
+simplified versions whose tolerance matches the output pixel size.
+Simplified layers are kept in GeoPackages in the plugin cache, keyed by
+the source file hash and a power-of-two tolerance level, so nearby
+scales share an entry and later exports only read them.
+"""
+
+import math
+import threading
+
+from qgis.core import (
+    QgsApplication, QgsFeatureRequest, QgsMemoryProviderUtils, QgsProcessingContext,
+    QgsProcessingFeedback, QgsProcessingUtils, QgsVectorLayer
+)
+
+from .cache_utils import atomic_write, cache_dir, content_hash, dataset_files
+from .map_join import normalize_pcode
+from .map_pipeline import map_frame_size, save_layer_to_gpkg, style_state_layer
+
+
+GPKG_LAYER = 'generalized'
+
+_lock = threading.Lock()
+
+
+def uses_generalization(config):
+    """Generalized stand-ins exist for township maps; aggregated units draw as they are"""
+    return config.generalize and config.level == 'township'
+
+
+def output_tolerance(extent, page_size, dpi):
+    """Map units covered by one output pixel when extent fills the map frame"""
+    width_mm, height_mm = map_frame_size(page_size)
+    pixels_x = width_mm / 25.4 * dpi
+    pixels_y = height_mm / 25.4 * dpi
+    return max(extent.width() / pixels_x, extent.height() / pixels_y)
+
+
+def tolerance_level(tolerance):
+    """Power-of-two level at or below the tolerance, or None for no simplification"""
+    if not tolerance or tolerance <= 0 or math.isinf(tolerance):
+        return None
+    return math.floor(math.log2(tolerance))
+
+
+def generalized_path(path, tolerance):
+    """Cache GeoPackage for a dataset at a tolerance (may not exist yet)"""
+    level = tolerance_level(tolerance)
+    if level is None:
+        return None
+    return cache_dir('generalized') / f'{content_hash(*dataset_files(path))[:20]}_{level}.gpkg'
+
+
+def generalized_layer(path, tolerance, name):
+    """Simplified copy of a dataset for the tolerance, generating it once if needed"""
+    gpkg = generalized_path(path, tolerance)
+    if gpkg is None:
+        return None
+    with _lock:
+        if not gpkg.exists():
+            _generalize(path, 2.0 ** tolerance_level(tolerance), gpkg)
+    layer = QgsVectorLayer(f'{gpkg}|layername={GPKG_LAYER}', name, 'ogr')
+    return layer if layer.isValid() else None
+
+
+def _generalize(path, tolerance, gpkg):
+    """Topology-preserving simplification into a GeoPackage
+
+    native:coveragesimplify (QGIS 3.36+) simplifies shared boundaries once,
+    so neighbouring polygons stay gap-free. Older QGIS versions, or inputs
+    that are not a valid coverage, fall back to per-feature Douglas-Peucker.
+    """
+    source = QgsVectorLayer(str(path), 'source', 'ogr')
+    attempts = [
+        ('native:coveragesimplify', {'PRESERVE_BOUNDARY': False}),
+        ('native:simplifygeometries', {'METHOD': 0}),
+    ]
+    registry = QgsApplication.processingRegistry()
+    for alg_id, extra in attempts:
+        alg = registry.createAlgorithmById(alg_id)
+        if alg is None:
+            continue
+        context = QgsProcessingContext()
+        params = dict(extra, INPUT=source, TOLERANCE=tolerance, OUTPUT='TEMPORARY_OUTPUT')
+        results, ok = alg.run(params, context, QgsProcessingFeedback())
+        if not ok:
+            continue
+        output = QgsProcessingUtils.mapLayerFromString(results['OUTPUT'], context)
+        atomic_write(gpkg, lambda tmp: save_layer_to_gpkg(output, tmp, GPKG_LAYER))
+        return
+    raise RuntimeError(f'Could not simplify {path}')
+
+
+def attribute_copy(layer):
+    """Memory copy of a layer's attributes and style, without geometries"""
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    copy = QgsMemoryProviderUtils.createMemoryLayer(
+        layer.name(), layer.fields(), layer.wkbType(), layer.crs()
+    )
+    copy.dataProvider().addFeatures(list(layer.getFeatures(request)))
+    copy.setRenderer(layer.renderer().clone())
+    if layer.labeling() is not None:
+        copy.setLabeling(layer.labeling().clone())
+    copy.setLabelsEnabled(layer.labelsEnabled())
+    return copy
+
+
+def copy_geometries(target, source, key_field):
+    """Fill target's geometries from source, matching features on key_field
+
+    Returns False (leaving target incomplete) when some feature has no match.
+    """
+    geometries = {}
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes([key_field], source.fields())
+    for feature in source.getFeatures(request):
+        geometries[normalize_pcode(feature[key_field])] = feature.geometry()
+
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([key_field], target.fields())
+    changes = {}
+    for feature in target.getFeatures(request):
+        geometry = geometries.get(normalize_pcode(feature[key_field]))
+        if geometry is None:
+            return False
+        changes[feature.id()] = geometry
+    return target.dataProvider().changeGeometryValues(changes)
+
+
+class ExportGeneralization:
+    """Generalized stand-ins for the map layers of one export
+
+    Create it on the GUI thread: it only takes an attribute copy of the
+    joined township layer. layers() does the simplification (or reads the
+    cache) and fills in the geometries, so it can run inside a task.
+    """
+
+    def __init__(self, build):
+        config = build.config
+        self.township_path = config.township_path
+        self.state_path = config.state_path
+        self.key_field = config.pcode_shp
+        self.tolerance = output_tolerance(build.township_layer.extent(), config.page_size, config.dpi)
+        self.townships = attribute_copy(build.township_layer)
+        self.states = None
+
+    def layers(self):
+        """[townships, states] for the map frame, or None to keep the originals"""
+        townships = generalized_layer(self.township_path, self.tolerance, 'Townships')
+        states = generalized_layer(self.state_path, self.tolerance, 'States')
+        if townships is None or states is None:
+            return None
+        if not copy_geometries(self.townships, townships, self.key_field):
+            return None
+        style_state_layer(states)
+        self.states = states
+        return [self.townships, states]
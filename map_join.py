@@ -0,0 +1,170 @@
+"""
+Myanmar Map Generator - Join engine
+"""
+
+from dataclasses import dataclass, field, asdict
+
+from qgis.core import QgsFeatureRequest, QgsField
+from qgis.PyQt.QtCore import QVariant
+import pandas as pd
+
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+
+@dataclass
+class JoinReport:
+    """Outcome of a join, computed in the same pass as the join itself"""
+    matched: int = 0
+    townships: int = 0
+    rows: int = 0
+    unmatched_pcodes: list = field(default_factory=list)
+    duplicate_pcodes: list = field(default_factory=list)
+    missing_pcode_rows: int = 0
+    townships_without_data: list = field(default_factory=list)
+    suggestions: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not (self.unmatched_pcodes or self.duplicate_pcodes or self.missing_pcode_rows)
+
+    def summary(self):
+        lines = [f'{self.matched} of {self.townships} townships matched ({self.rows} data rows).']
+        if self.unmatched_pcodes:
+            lines.append(f'{len(self.unmatched_pcodes)} P_Code(s) not found in the shapefile: '
+                         f'{_preview(self.unmatched_pcodes)}')
+        if self.duplicate_pcodes:
+            lines.append(f'{len(self.duplicate_pcodes)} duplicated P_Code(s), first row used: '
+                         f'{_preview(self.duplicate_pcodes)}')
+        if self.missing_pcode_rows:
+            lines.append(f'{self.missing_pcode_rows} row(s) without a P_Code.')
+        accepted = [s for s in self.suggestions if s.accepted]
+        if accepted:
+            lines.append(f'{len(accepted)} P_Code(s) matched approximately: '
+                         f'{_preview([f"{s.pcode} -> {s.suggested_pcode}" for s in accepted])}')
+        proposed = [s for s in self.suggestions if not s.accepted]
+        if proposed:
+            lines.append('Closest townships for unmatched P_Codes: '
+                         f'{_preview([f"{s.pcode} -> {s.suggested_pcode} {s.suggested_name} ({s.score:.0%})" for s in proposed])}')
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _preview(values, limit=10):
+    text = ', '.join(str(v) for v in values[:limit])
+    return text + (', ...' if len(values) > limit else '')
+
+
+def normalize_pcode(value):
+    """Normalize a P_Code for matching"""
+    return str(value).strip().upper()
+
+
+def normalize_pcodes(series):
+    """Vectorized normalize_pcode for a pandas Series"""
+    return series.astype(str).str.strip().str.upper()
+
+
+def field_type(series):
+    """QVariant type that keeps the meaning of a data column"""
+    if pd.api.types.is_bool_dtype(series):
+        return QVariant.Bool
+    if pd.api.types.is_integer_dtype(series) or (
+            pd.api.types.is_float_dtype(series) and _is_integral(series)):
+        values = series.dropna()
+        if values.empty or (values.min() >= INT32_MIN and values.max() <= INT32_MAX):
+            return QVariant.Int
+        return QVariant.LongLong
+    if pd.api.types.is_float_dtype(series):
+        return QVariant.Double
+    return QVariant.String
+
+
+def _is_integral(series):
+    """True for float columns that only hold whole numbers (ints with blanks)"""
+    values = series.dropna()
+    return not values.empty and bool((values % 1 == 0).all())
+
+
+def _column_values(series, variant_type):
+    """Python values for a column, NaN as None (NULL)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    if variant_type in (QVariant.Int, QVariant.LongLong):
+        values = series.astype('Int64')
+    elif variant_type == QVariant.String:
+        values = series.where(series.isna(), series.astype(str))
+    else:
+        values = series
+    return [None if pd.isna(v) else (v.item() if hasattr(v, 'item') else v) for v in values.astype(object)]
+
+
+def build_joined_layer(source_layer, df, pcode_shp, pcode_excel, name='Townships'):
+    """Copy the township layer into memory and join the data columns onto it
+
+    The shapefile itself is never modified. Returns (layer, JoinReport).
+    """
+    layer = source_layer.materialize(QgsFeatureRequest())
+    layer.setName(name)
+    return layer, join_columns(layer, df, pcode_shp, pcode_excel)
+
+
+def join_columns(layer, df, pcode_shp, pcode_excel):
+    """Join the data columns of df onto a memory layer; returns a JoinReport
+
+    The join is a single pandas merge between the data frame and the
+    township P_Codes, keyed by normalized P_Code. Numeric columns become
+    Int/Double fields, and all values are written through one bulk
+    changeAttributeValues() call on the layer's provider.
+    """
+    provider = layer.dataProvider()
+
+    # Data side: normalized keys, duplicates reported and dropped (first row wins)
+    data = df[df[pcode_excel].notna()]
+    data = data.drop(columns=[pcode_excel]).assign(_key=normalize_pcodes(data[pcode_excel]).values)
+    duplicated = data['_key'].duplicated(keep=False)
+    duplicate_pcodes = sorted(data.loc[duplicated, '_key'].unique())
+    data = data.drop_duplicates('_key', keep='first')
+
+    # Township side: feature ids and normalized keys, no geometry
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([pcode_shp], layer.fields())
+    fids, keys = [], []
+    for feature in layer.getFeatures(request):
+        fids.append(feature.id())
+        keys.append(feature[pcode_shp])
+    townships = pd.DataFrame({'_fid': fids, '_key': normalize_pcodes(pd.Series(keys, dtype=object))})
+
+    merged = townships.merge(data, on='_key', how='outer', indicator=True)
+    side = merged['_merge']
+    matched = merged[side == 'both']
+
+    report = JoinReport(
+        matched=len(matched),
+        townships=len(townships),
+        rows=len(df),
+        unmatched_pcodes=sorted(merged.loc[side == 'right_only', '_key']),
+        duplicate_pcodes=duplicate_pcodes,
+        missing_pcode_rows=int(df[pcode_excel].isna().sum()),
+        townships_without_data=sorted(merged.loc[side == 'left_only', '_key']),
+    )
+
+    # Typed fields for new columns; columns that already exist keep their field
+    data_fields = [c for c in data.columns if c != '_key']
+    types = {c: field_type(data[c]) for c in data_fields}
+    existing = set(layer.fields().names())
+    provider.addAttributes([QgsField(c, types[c]) for c in data_fields if c not in existing])
+    layer.updateFields()
+
+    fields = layer.fields()
+    columns = [(fields.indexOf(c), _column_values(matched[c], types[c])) for c in data_fields]
+    changes = {
+        int(fid): {index: values[row] for index, values in columns}
+        for row, fid in enumerate(matched['_fid'])
+    }
+    if changes:
+        provider.changeAttributeValues(changes)
+    return report
@@ -0,0 +1,190 @@
+"""
+Myanmar Map Generator - Label anchors and placement cache
+
+Labels are anchored on each township's pole of inaccessibility, the
+inner point farthest from its boundary, so the labeling engine only
+tries a few positions around one point instead of searching the whole
+polygon. Anchors are computed once per shapefile and kept in the plugin
+cache (`anchors/`). Placement results are cached too (`labels/`), keyed
+by the labeled data, the label settings, extent, frame size and DPI, so
+later exports at the same framing skip the labeling engine.
+"""
+
+import hashlib
+import json
+import threading
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.PyQt.QtXml import QDomDocument
+from qgis.core import (
+    Qgis, QgsExpression, QgsFeatureRequest, QgsField, QgsLabelingEngineSettings, QgsReadWriteContext
+)
+
+from .cache_utils import atomic_write, cache_dir, content_hash, dataset_files, prune_cache, short_hash
+from .map_aggregate import LEVELS, name_column, unit_pcode_field
+from .map_join import normalize_pcode
+from .map_pipeline import build_labeling
+
+
+ANCHOR_X = 'label_x'
+ANCHOR_Y = 'label_y'
+# Pole of inaccessibility precision, as a share of the polygon's larger side
+ANCHOR_PRECISION = 0.01
+MAX_PLACEMENTS = 64
+
+_lock = threading.Lock()
+
+
+def compute_anchors(layer, pcode_field):
+    """{normalized P_Code: (x, y)} of the pole of inaccessibility of every polygon"""
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes([pcode_field], layer.fields())
+    anchors = {}
+    for feature in layer.getFeatures(request):
+        if not feature.hasGeometry():
+            continue
+        geometry = feature.geometry()
+        box = geometry.boundingBox()
+        precision = max(box.width(), box.height()) * ANCHOR_PRECISION
+        pole = geometry.poleOfInaccessibility(precision) if precision > 0 else geometry.pointOnSurface()
+        if isinstance(pole, tuple):
+            pole = pole[0]
+        if pole.isNull():
+            continue
+        point = pole.asPoint()
+        anchors[normalize_pcode(feature[pcode_field])] = (point.x(), point.y())
+    return anchors
+
+
+def cached_anchors(layer, path, pcode_field):
+    """compute_anchors for a shapefile, computed once per file contents"""
+    cache = cache_dir('anchors') / (
+        f'{content_hash(*dataset_files(path))[:20]}_{short_hash(pcode_field, ANCHOR_PRECISION)}.json'
+    )
+    try:
+        return {key: tuple(point) for key, point in json.loads(cache.read_text(encoding='utf-8')).items()}
+    except (OSError, ValueError):
+        pass
+    anchors = compute_anchors(layer, pcode_field)
+    atomic_write(cache, json.dumps(anchors))
+    return anchors
+
+
+def add_anchor_fields(layer, anchors, pcode_field):
+    """Write anchors into label_x/label_y fields of a memory layer; returns the number set"""
+    provider = layer.dataProvider()
+    if layer.fields().indexOf(ANCHOR_X) < 0:
+        provider.addAttributes([QgsField(ANCHOR_X, QVariant.Double), QgsField(ANCHOR_Y, QVariant.Double)])
+        layer.updateFields()
+    fields = layer.fields()
+    x_index, y_index = fields.indexOf(ANCHOR_X), fields.indexOf(ANCHOR_Y)
+
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([pcode_field], fields)
+    changes = {}
+    for feature in layer.getFeatures(request):
+        point = anchors.get(normalize_pcode(feature[pcode_field]))
+        if point is not None:
+            changes[feature.id()] = {x_index: point[0], y_index: point[1]}
+    if changes:
+        provider.changeAttributeValues(changes)
+    return len(changes)
+
+
+def apply_label_anchors(config, source_layer, layer):
+    """Add label anchors to a joined (or rolled-up) layer; returns the number set
+
+    Township anchors come from the cache of the source shapefile; the few
+    rolled-up units are computed directly.
+    """
+    if not config.label_anchors:
+        return 0
+    if config.level in LEVELS:
+        key = unit_pcode_field(config)
+        return add_anchor_fields(layer, compute_anchors(layer, key), key)
+    anchors = cached_anchors(source_layer, config.township_path, config.pcode_shp)
+    return add_anchor_fields(layer, anchors, config.pcode_shp)
+
+
+def has_anchors(layer):
+    return layer.fields().indexOf(ANCHOR_X) >= 0 and layer.fields().indexOf(ANCHOR_Y) >= 0
+
+
+def config_labeling(config, layer, label_col=None):
+    """Labeling of a config for a layer, anchored when the layer has anchors"""
+    return build_labeling(
+        name_column(config), label_col or config.label_col, config.label_size,
+        anchors=(ANCHOR_X, ANCHOR_Y) if has_anchors(layer) else None,
+        priority=config.label_priority, obstacles=config.label_obstacles
+    )
+
+
+def apply_labeling_engine(config, project):
+    """Set the project's labeling engine limits from a config"""
+    settings = QgsLabelingEngineSettings(project.labelingEngineSettings())
+    # Candidate limits exist from QGIS 3.12
+    if hasattr(settings, 'setMaximumPolygonCandidatesPerCmSquared'):
+        settings.setMaximumPolygonCandidatesPerCmSquared(config.label_candidates)
+    project.setLabelingEngineSettings(settings)
+
+
+def label_fingerprint(layer):
+    """Hash of what decides a layer's label placement: label settings, label values and anchors
+
+    Geometries are included only when labels are not anchored.
+    """
+    settings = layer.labeling().settings()
+    doc = QDomDocument()
+    doc.appendChild(settings.writeXml(doc, QgsReadWriteContext()))
+    digest = hashlib.sha1(doc.toString().encode('utf-8'))
+    digest.update(layer.crs().authid().encode('utf-8'))
+
+    fields = layer.fields()
+    anchored = settings.geometryGeneratorEnabled and has_anchors(layer)
+    columns = set()
+    if settings.isExpression:
+        columns = set(QgsExpression(settings.fieldName).referencedColumns())
+    else:
+        columns.add(settings.fieldName)
+    if anchored:
+        columns.update((ANCHOR_X, ANCHOR_Y))
+    request = QgsFeatureRequest()
+    if anchored:
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+    if QgsFeatureRequest.ALL_ATTRIBUTES not in columns:
+        request.setSubsetOfAttributes(sorted(c for c in columns if fields.indexOf(c) >= 0), fields)
+    for feature in layer.getFeatures(request):
+        digest.update(repr((feature.id(), feature.attributes())).encode('utf-8'))
+        if not anchored and feature.hasGeometry():
+            digest.update(bytes(feature.geometry().asWkb()))
+    return digest.hexdigest()
+
+
+def placement_key(settings, layers):
+    """Cache key of a labeling run: labeled layers, framing, DPI and engine settings"""
+    engine = settings.labelingEngineSettings()
+    candidates = getattr(engine, 'maximumPolygonCandidatesPerCmSquared', lambda: None)()
+    extent = settings.visibleExtent()
+    size = settings.outputSize()
+    return short_hash([label_fingerprint(layer) for layer in layers], extent.toString(6), size.width(),
+                      size.height(), settings.outputDpi(), settings.destinationCrs().authid(),
+                      int(engine.flags()), candidates, Qgis.QGIS_VERSION)
+
+
+def cached_placements(key):
+    """[[(x, y, text)] per layer] stored under key, or None"""
+    path = cache_dir('labels') / f'{key}.json'
+    try:
+        placements = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    path.touch()
+    return [[tuple(label) for label in labels] for labels in placements]
+
+
+def store_placements(key, placements):
+    folder = cache_dir('labels')
+    atomic_write(folder / f'{key}.json', json.dumps(placements, ensure_ascii=False))
+    with _lock:
+        prune_cache(folder, '*.json', MAX_PLACEMENTS)
@@ -0,0 +1,206 @@
+"""
+Myanmar Map Generator - Run metrics and profiling
+
+Every run records wall time, feature counts and memory per pipeline
+stage: the process memory peak so far and how much the stage raised it.
+The peak of a process never goes down, so the growth is the per-stage
+figure. Finished runs are appended to runs.jsonl in the
+plugin cache, so slow runs on an operator's machine can be diagnosed
+from the log alone. With profiling on (MapConfig.profile or the
+MYANMAR_MAP_PROFILE environment variable), each stage also runs under
+cProfile, and tracemalloc records the stage's own Python memory peak and
+where Python memory was allocated.
+"""
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import cProfile
+import ctypes
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from .cache_utils import cache_dir
+
+
+LOG_NAME = 'runs.jsonl'
+TOP_ALLOCATIONS = 25
+
+
+def profiling_requested(config):
+    return bool(getattr(config, 'profile', False) or os.environ.get('MYANMAR_MAP_PROFILE'))
+
+
+def peak_memory_mb():
+    """Highest resident memory of this process so far, in MB (None if unknown)"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_memory_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+class _MemoryCounters(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_uint32) for name in ('cb', 'PageFaultCount')] + [
+        (name, ctypes.c_size_t) for name in (
+            'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+            'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage'
+        )
+    ]
+
+
+def _windows_peak_memory_mb():
+    try:
+        counters = _MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize / 2**20
+
+
+def noop(*args):
+    """Stand-in for a missing progress or is_canceled callback"""
+    return False
+
+
+def stage(metrics, name, **info):
+    """metrics.stage(...), or a no-op context when there is no RunMetrics"""
+    return metrics.stage(name, **info) if metrics is not None else nullcontext({})
+
+
+class RunMetrics:
+    """Per-stage measurements of one map run
+
+    Stages may run on different threads (build task, export task, export
+    workers); each one is recorded when its `with` block ends. Memory of
+    stages that overlap in time is counted in each of them.
+
+    A profiled run traces Python allocations until finish() or close();
+    runs that fail or are cancelled must be closed (or used as a context
+    manager) so tracing stops.
+    """
+
+    def __init__(self, title='', kind='map', profile=False):
+        self.title = title
+        self.kind = kind
+        self.profile = profile
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.stages = []
+        self.log_path = None
+        self.profile_path = None
+        self._lock = threading.Lock()
+        self._stats = None
+        self._tracing = False
+        if profile and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    @classmethod
+    def for_config(cls, config, kind='map'):
+        return cls(config.title, kind, profile=profiling_requested(config))
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Time a block; the yielded dict takes extra values such as feature counts"""
+        record = dict(info)
+        profiler = cProfile.Profile() if self.profile else None
+        peak_before = peak_memory_mb()
+        # reset_peak() exists from Python 3.9
+        traced = self._tracing and hasattr(tracemalloc, 'reset_peak')
+        if traced:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler; concurrent stages go unprofiled
+                profiler = None
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = round(time.perf_counter() - start, 4)
+            peak = peak_memory_mb()
+            growth = peak - peak_before if peak is not None and peak_before is not None else None
+            record = dict(stage=name, seconds=seconds, peak_mb=_round(peak), peak_growth_mb=_round(growth), **record)
+            if traced and tracemalloc.is_tracing():
+                record['python_peak_mb'] = _round(tracemalloc.get_traced_memory()[1] / 2**20)
+            with self._lock:
+                self.stages.append(record)
+                if profiler is not None:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profiler)
+                    else:
+                        self._stats.add(profiler)
+
+    def total_seconds(self):
+        return sum(record['seconds'] for record in self.stages)
+
+    def summary(self):
+        """One line per run: time per stage, the memory peak and the stage that raised it most"""
+        parts = [f'{record["stage"].replace("_", " ")} {record["seconds"]:.2f} s' for record in self.stages]
+        peaks = [record['peak_mb'] for record in self.stages if record['peak_mb'] is not None]
+        if peaks:
+            parts.append(f'peak {max(peaks):.0f} MB')
+        grown = [record for record in self.stages if record.get('peak_growth_mb')]
+        if grown:
+            top = max(grown, key=lambda record: record['peak_growth_mb'])
+            parts.append(f'+{top["peak_growth_mb"]:.0f} MB in {top["stage"].replace("_", " ")}')
+        return ' | '.join(parts)
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'kind': self.kind,
+            'title': self.title,
+            'total_seconds': round(self.total_seconds(), 4),
+            'stages': list(self.stages),
+        }
+
+    def finish(self, **extra):
+        """Append the run to the log (and write the profile); returns the log record"""
+        try:
+            record = dict(self.to_dict(), **extra)
+            logs = cache_dir('logs')
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            if self._stats is not None:
+                self.profile_path = logs / f'profile_{stamp}.prof'
+                self._stats.dump_stats(str(self.profile_path))
+                record['profile'] = str(self.profile_path)
+            if self._tracing and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                record['allocations'] = [str(s) for s in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+        finally:
+            self.close()
+
+        self.log_path = logs / LOG_NAME
+        with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+        return record
+
+    def close(self):
+        """Stop the allocation tracing this run started; safe to call more than once"""
+        if self._tracing:
+            self._tracing = False
+            tracemalloc.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
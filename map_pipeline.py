@@ -0,0 +1,329 @@
+"""
+Myanmar Map Generator - Map pipeline stages
+
+Every function here takes plain values instead of widgets, so the stages
+can run inside a QgsTask as well as on the GUI thread.
+"""
+
+from qgis.PyQt.QtGui import QColor, QFont
+from qgis.core import (
+    NULL, QgsExpression, QgsExpressionContext, QgsFeature, QgsFeatureRequest, QgsVectorLayer,
+    QgsVectorFileWriter, QgsCoordinateTransformContext,
+    QgsCategorizedSymbolRenderer, QgsSymbol, QgsRendererCategory,
+    QgsPalLayerSettings, QgsTextFormat, QgsVectorLayerSimpleLabeling,
+    QgsPrintLayout, QgsLayoutExporter, QgsLayoutItemMap,
+    QgsLayoutItemLegend, QgsLayoutItemLabel, QgsLayoutSize,
+    QgsUnitTypes, QgsLayoutPoint, QgsWkbTypes
+)
+from collections import Counter
+from pathlib import Path
+
+
+COLORS = [
+    '#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6',
+    '#1abc9c', '#34495e', '#e67e22', '#95a5a6', '#16a085',
+    '#27ae60', '#2980b9', '#8e44ad', '#c0392b', '#d35400',
+    '#7f8c8d', '#bdc3c7', '#ecf0f1', '#f1c40f', '#e8daef',
+    '#d5f4e6', '#fdebd0', '#fadbd8', '#d6eaf8', '#ebf5fb'
+]
+
+PAGE_SIZES = {
+    'A3': (297, 420),
+    'A4': (210, 297),
+}
+
+# Layout geometry in millimetres
+MARGIN = 10
+MAP_TOP = 25
+LEGEND_HEIGHT = 60
+
+# Layers with this property look the same in every run (see map_basemap)
+STATIC_LAYER_PROPERTY = 'myanmar_map/static'
+
+
+def load_layers(state_path, township_path):
+    """Load the state and township shapefiles"""
+    state_layer = QgsVectorLayer(state_path, 'States', 'ogr')
+    township_layer = QgsVectorLayer(township_path, 'Townships', 'ogr')
+    for layer, path in ((state_layer, state_path), (township_layer, township_path)):
+        if not layer.isValid():
+            raise ValueError(f'Could not load shapefile: {path}')
+    return state_layer, township_layer
+
+
+def save_layer_to_gpkg(layer, path, layer_name):
+    """Write a layer into a GeoPackage, adding to the file when it already exists"""
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'GPKG'
+    options.layerName = layer_name
+    if Path(path).exists():
+        options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    result = QgsVectorFileWriter.writeAsVectorFormatV2(
+        layer, str(path), QgsCoordinateTransformContext(), options
+    )
+    if result[0] != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f'Failed to write {path}: {result[1]}')
+
+
+def style_state_layer(state_layer):
+    """Transparent fill with a grey outline; the layer is marked static"""
+    state_layer.setCustomProperty(STATIC_LAYER_PROPERTY, True)
+    state_symbol = QgsSymbol.defaultSymbol(state_layer.geometryType())
+    state_symbol.setColor(QColor(255, 255, 255, 0))
+    state_symbol.symbolLayer(0).setStrokeColor(QColor('#a8a5a5'))
+    state_symbol.symbolLayer(0).setStrokeWidth(0.5)
+    state_layer.renderer().setSymbol(state_symbol)
+
+
+def is_static_layer(layer):
+    """True for reference layers whose rendering does not depend on the data"""
+    return layer.customProperty(STATIC_LAYER_PROPERTY) in (True, 'true')
+
+
+def _fill_symbol(layer, color):
+    symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+    symbol.setColor(QColor(color))
+    symbol.setOpacity(0.8)
+    symbol.symbolLayer(0).setStrokeColor(QColor('#ffffff'))
+    symbol.symbolLayer(0).setStrokeWidth(0.3)
+    return symbol
+
+
+def category_value(val):
+    """Category key of a data table value; empty values become 'NA'
+
+    Layer attributes are keyed by category_keys(), which evaluates the
+    renderer's expression.
+    """
+    if val is None or val == NULL or val == '':
+        return 'NA'
+    if isinstance(val, bool):
+        return 'true' if val else 'false'
+    if isinstance(val, float) and val.is_integer():
+        return str(int(val))
+    return str(val)
+
+
+def category_expression(category_col):
+    """Expression giving the category key of a feature at render time"""
+    field = QgsExpression.quotedColumnRef(category_col)
+    return f"CASE WHEN {field} IS NULL OR to_string({field}) = '' THEN 'NA' ELSE to_string({field}) END"
+
+
+def binary_expression(category_col):
+    """Expression giving 'Has Data'/'No Data' for the category column at render time"""
+    field = QgsExpression.quotedColumnRef(category_col)
+    return (
+        f"CASE WHEN {field} IS NULL OR trim(to_string({field})) IN ('', 'NA') "
+        f"THEN 'No Data' ELSE 'Has Data' END"
+    )
+
+
+def category_keys(fields, category_col):
+    """Function giving the render-time category key of an attribute value
+
+    QGIS formats booleans and doubles differently from Python's str(),
+    so each distinct value is keyed by evaluating category_expression()
+    itself, once.
+    """
+    index = fields.indexOf(category_col)
+    expression = QgsExpression(category_expression(category_col))
+    context = QgsExpressionContext()
+    context.setFields(fields)
+    feature = QgsFeature(fields)
+    keys = {}
+
+    def key(value):
+        if value is None or value == NULL:
+            return 'NA'
+        result = keys.get(value)
+        if result is None:
+            feature.setAttribute(index, value)
+            context.setFeature(feature)
+            result = keys[value] = str(expression.evaluate(context))
+        return result
+    return key
+
+
+def category_counts(layer, category_col):
+    """Feature count per category key, keyed as the renderer evaluates them
+
+    Only the category attribute is fetched (no geometry), so this stays
+    cheap on large polygon layers.
+    """
+    index = layer.fields().indexOf(category_col)
+    if index < 0:
+        raise KeyError(f'Field not found: {category_col}')
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([index])
+    values = Counter(None if v is None or v == NULL else v
+                     for v in (f.attribute(index) for f in layer.getFeatures(request)))
+    key = category_keys(layer.fields(), category_col)
+    counts = Counter()
+    for value, n in values.items():
+        counts[key(value)] += n
+    return counts
+
+
+def binary_counts(counts):
+    """Fold category counts into 'Has Data'/'No Data' counts, as binary_expression() does"""
+    result = Counter()
+    for cat, n in counts.items():
+        result['No Data' if cat.strip() in ('', 'NA') else 'Has Data'] += n
+    return result
+
+
+def _legend_label(cat, counts, show_counts):
+    return f'{cat} ({counts.get(cat, 0)})' if show_counts else cat
+
+
+def category_palette(categories):
+    """Colour per category key, in the order build_renderer assigns them"""
+    return {cat: COLORS[i % len(COLORS)] for i, cat in enumerate(sorted(categories))}
+
+
+def build_renderer(layer, category_col, multi_color, data_color, no_data_color,
+                   counts=None, show_counts=False, palette=None):
+    """Categorized renderer for the township layer
+
+    counts (category key -> feature count, see category_counts) can be
+    passed in from a cache; it is computed from the layer otherwise.
+    A palette (see category_palette) fixes the colours and legend entries,
+    e.g. to keep them stable across the maps of a series.
+    """
+    if counts is None:
+        counts = category_counts(layer, category_col)
+
+    cat_list = []
+    if multi_color:
+        palette = palette or category_palette(counts)
+        for cat, color in palette.items():
+            symbol = _fill_symbol(layer, color)
+            cat_list.append(QgsRendererCategory(cat, symbol, _legend_label(cat, counts, show_counts)))
+        return QgsCategorizedSymbolRenderer(category_expression(category_col), cat_list)
+
+    counts = binary_counts(counts)
+    for cat_type in ['Has Data', 'No Data']:
+        color = data_color if cat_type == 'Has Data' else no_data_color
+        label = _legend_label(cat_type, counts, show_counts)
+        cat_list.append(QgsRendererCategory(cat_type, _fill_symbol(layer, color), label))
+    return QgsCategorizedSymbolRenderer(binary_expression(category_col), cat_list)
+
+
+def build_labeling(township_col, label_col, label_size, anchors=None, priority=5, obstacles=True):
+    """Township labels: "<township> - <label>"
+
+    anchors names the x and y fields of precomputed label points (see
+    map_labels); labels are then placed around those points, or on the
+    surface where a feature has none.
+    """
+    settings = QgsPalLayerSettings()
+    fmt = QgsTextFormat()
+    fmt.setFont(QFont('Arial', label_size))
+    fmt.setSize(label_size)
+    fmt.buffer().setEnabled(True)
+    fmt.buffer().setSize(0.5)
+    settings.setFormat(fmt)
+
+    settings.fieldName = f'"{township_col}" || \' - \' || "{label_col}"'
+    settings.isExpression = True
+    settings.enabled = True
+    settings.priority = priority
+    settings.obstacleSettings().setIsObstacle(obstacles)
+    if anchors:
+        x, y = (QgsExpression.quotedColumnRef(name) for name in anchors)
+        settings.geometryGeneratorEnabled = True
+        settings.geometryGeneratorType = QgsWkbTypes.PointGeometry
+        settings.geometryGenerator = f'coalesce(make_point({x}, {y}), point_on_surface(@geometry))'
+        settings.placement = QgsPalLayerSettings.AroundPoint
+    return QgsVectorLayerSimpleLabeling(settings)
+
+
+def map_frame_size(page_size):
+    """Width and height (mm) of the map frame on a page"""
+    pw, ph = PAGE_SIZES.get(page_size, PAGE_SIZES['A4'])
+    return pw - 2*MARGIN, ph - MAP_TOP - LEGEND_HEIGHT - MARGIN
+
+
+def find_map_item(layout):
+    """The map frame of a layout built by build_layout"""
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemMap):
+            return item
+    return None
+
+
+def build_layout(project, title_text, page_size, township_layer, state_layer):
+    """Print layout with title, map and legend"""
+    layout = QgsPrintLayout(project)
+    layout.initializeDefaults()
+    layout.setName(title_text)
+
+    # Page size
+    width, height = PAGE_SIZES.get(page_size, PAGE_SIZES['A4'])
+    page = layout.pageCollection().page(0)
+    page.setPageSize(QgsLayoutSize(width, height, QgsUnitTypes.LayoutMillimeters))
+
+    pw = page.pageSize().width()
+    ph = page.pageSize().height()
+    margin = MARGIN
+
+    # Title
+    title = QgsLayoutItemLabel(layout)
+    title.setText(title_text)
+    title.setFont(QFont('Arial', 18, QFont.Bold))
+    title.attemptMove(QgsLayoutPoint(margin, margin, QgsUnitTypes.LayoutMillimeters))
+    title.attemptResize(QgsLayoutSize(pw - 2*margin, 12, QgsUnitTypes.LayoutMillimeters))
+    layout.addLayoutItem(title)
+
+    # Map
+    legend_height = LEGEND_HEIGHT
+    map_width, map_height = map_frame_size(page_size)
+
+    map_item = QgsLayoutItemMap(layout)
+    map_item.attemptMove(QgsLayoutPoint(margin, MAP_TOP, QgsUnitTypes.LayoutMillimeters))
+    map_item.attemptResize(QgsLayoutSize(map_width, map_height, QgsUnitTypes.LayoutMillimeters))
+    map_item.setExtent(township_layer.extent())
+    map_item.setLayers([township_layer, state_layer])
+    map_item.refresh()
+    layout.addLayoutItem(map_item)
+
+    # Legend
+    legend = QgsLayoutItemLegend(layout)
+    legend.setLinkedMap(map_item)
+    legend.setTitle('Legend')
+    legend.attemptMove(QgsLayoutPoint(margin, ph - legend_height - margin, QgsUnitTypes.LayoutMillimeters))
+    legend.attemptResize(QgsLayoutSize(pw - 2*margin, legend_height, QgsUnitTypes.LayoutMillimeters))
+    legend.updateLegend()
+    layout.addLayoutItem(legend)
+
+    return layout
+
+
+def export_targets(output_folder, title, png=True, pdf=True):
+    """List of (kind, path) outputs for a map title"""
+    filename = title.replace(' ', '_')
+    targets = []
+    if png:
+        targets.append(('png', str(Path(output_folder) / f'{filename}.png')))
+    if pdf:
+        targets.append(('pdf', str(Path(output_folder) / f'{filename}.pdf')))
+    return targets
+
+
+def export_layout(layout, kind, path, dpi):
+    """Export a layout to a PNG or PDF file"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    exporter = QgsLayoutExporter(layout)
+    if kind == 'png':
+        settings = QgsLayoutExporter.ImageExportSettings()
+        settings.dpi = dpi
+        result = exporter.exportToImage(path, settings)
+    else:
+        settings = QgsLayoutExporter.PdfExportSettings()
+        settings.dpi = dpi
+        result = exporter.exportToPdf(path, settings)
+
+    if result != QgsLayoutExporter.Success:
+        raise RuntimeError(f'Failed to export {path} (error code {int(result)})')
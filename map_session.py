@@ -0,0 +1,144 @@
+"""
+Myanmar Map Generator - Session cache of loaded layers
+
+The session keeps the layers of the last run alive in the project and
+compares each new MapConfig with the previous one, so only the stages a
+change actually affects are re-executed: a colour change only swaps the
+renderer, a label change only the labeling, and a new category column
+joins that one column and swaps the renderer.
+"""
+
+from dataclasses import fields
+
+from qgis.core import QgsProject
+
+from .cache_utils import file_signature
+from .data_loader import load_table, sheet_key
+from .map_join import join_columns
+from .map_labels import apply_labeling_engine, config_labeling
+from .map_metrics import RunMetrics
+from .map_pipeline import build_renderer
+from .pcode_match import apply_fuzzy_match
+
+
+# Settings that require reloading the layers and redoing the whole join
+LOAD_FIELDS = ('state_path', 'township_path', 'excel_path', 'sheet', 'pcode_shp', 'pcode_excel', 'level',
+               'name_shp', 'fuzzy_match', 'match_threshold', 'label_anchors')
+RENDERER_FIELDS = ('category_col', 'multi_color', 'data_color', 'no_data_color', 'show_counts')
+LABEL_FIELDS = ('show_labels', 'label_size', 'township_col', 'label_col', 'label_candidates', 'label_obstacles',
+                'label_priority')
+
+
+def data_columns(config):
+    """Data columns a config needs on the joined layer"""
+    return [c for c in dict.fromkeys((config.category_col, config.township_col, config.label_col)) if c]
+
+
+class MapSession:
+    """Last MapBuild plus what is needed to update it incrementally"""
+
+    def __init__(self):
+        self.build = None
+        self.layer_ids = ()
+        self.signatures = None
+        self.joined = set()
+
+    def reset(self):
+        self.__init__()
+
+    def plan(self, config, project):
+        """Stages needed to reach config: ['load'], or any of join/renderer/labels"""
+        if self.build is None or not self._layers_alive(project):
+            return ['load']
+        # Rolled-up units are rebuilt as a whole; the aggregation itself is cheap
+        if config.level != 'township':
+            return ['load']
+        try:
+            if _signatures(config) != self.signatures:
+                return ['load']
+        except OSError:
+            return ['load']
+
+        previous = self.build.config
+        changed = {f.name for f in fields(config) if getattr(config, f.name) != getattr(previous, f.name)}
+        if changed.intersection(LOAD_FIELDS):
+            return ['load']
+
+        stages = []
+        if self._missing_columns(config):
+            stages.append('join')
+        if changed.intersection(RENDERER_FIELDS):
+            stages.append('renderer')
+        if changed.intersection(LABEL_FIELDS):
+            stages.append('labels')
+        return stages
+
+    def adopt(self, build):
+        """Start a new session from a full build whose layers are in the project"""
+        self.build = build
+        self.layer_ids = tuple(layer.id() for layer in build.layers())
+        self.signatures = _signatures(build.config)
+        self.joined = set(data_columns(build.config))
+
+    def update(self, config, stages):
+        """Run the incremental stages on the cached layers (GUI thread)"""
+        build = self.build
+        layer = build.township_layer
+        metrics = build.metrics = RunMetrics.for_config(config, kind='update')
+        try:
+            if 'join' in stages:
+                missing = self._missing_columns(config)
+                # The township names are read too, so rows match by name as in a full build
+                columns = [config.pcode_excel] + missing
+                if config.township_col:
+                    columns.append(config.township_col)
+                with metrics.stage('excel_read') as record:
+                    df = load_table(config.excel_path, columns=list(dict.fromkeys(columns)),
+                                    sheet_name=sheet_key(config.sheet))
+                    record['rows'] = len(df)
+                with metrics.stage('join') as record:
+                    df, suggestions = apply_fuzzy_match(config, layer, df)
+                    df = df[[c for c in df.columns if c == config.pcode_excel or c in missing]]
+                    build.join_report = join_columns(layer, df, config.pcode_shp, config.pcode_excel)
+                    build.join_report.suggestions = suggestions
+                    record['matched'] = build.join_report.matched
+                build.forget_counts()
+                self.joined.update(missing)
+
+            if 'renderer' in stages:
+                with metrics.stage('category_scan') as record:
+                    counts = build.category_counts(config.category_col)
+                    record['categories'] = len(counts)
+                with metrics.stage('styling'):
+                    build.renderer = build_renderer(
+                        layer, config.category_col, config.multi_color,
+                        config.data_color, config.no_data_color,
+                        counts=counts, show_counts=config.show_counts
+                    )
+                    layer.setRenderer(build.renderer)
+
+            if 'labels' in stages:
+                build.labeling = None
+                if config.show_labels:
+                    build.labeling = config_labeling(config, layer)
+                    layer.setLabeling(build.labeling)
+                layer.setLabelsEnabled(config.show_labels)
+                apply_labeling_engine(config, QgsProject.instance())
+        except BaseException:
+            metrics.close()
+            raise
+
+        build.config = config
+        layer.triggerRepaint()
+        return build
+
+    def _layers_alive(self, project):
+        return all(project.mapLayer(layer_id) is not None for layer_id in self.layer_ids)
+
+    def _missing_columns(self, config):
+        return [c for c in data_columns(config) if c not in self.joined]
+
+
+def _signatures(config):
+    """File identities the loaded layers and data depend on"""
+    return tuple(file_signature(p) for p in (config.state_path, config.township_path, config.excel_path))
@@ -0,0 +1,153 @@
+"""
+Myanmar Map Generator - Background tasks
+"""
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import QgsTask
+
+from .map_atlas import export_atlas
+from .map_batch import run_batch
+from .map_core import build_map, export_outputs
+from .map_timeseries import export_series
+from .web_export import export_web
+
+
+class MapTask(QgsTask):
+    """Base task: keeps the error and calls on_finished on the GUI thread"""
+
+    def __init__(self, description, on_finished=None):
+        super().__init__(description, QgsTask.CanCancel)
+        self.on_finished = on_finished
+        self.exception = None
+
+    def run(self):
+        try:
+            return self.run_stages()
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def run_stages(self):
+        raise NotImplementedError
+
+    def finished(self, result):
+        if self.on_finished:
+            self.on_finished(self, result)
+
+
+class BuildMapTask(MapTask):
+    """Load, join and style the layers off the GUI thread
+
+    The finished MapBuild is left on the task for the GUI thread to add
+    to the project.
+    """
+
+    def __init__(self, config, on_finished=None):
+        super().__init__(f'Myanmar map: {config.title}', on_finished)
+        self.config = config
+        self.build = None
+
+    def run_stages(self):
+        build = build_map(self.config, progress=self.setProgress, is_canceled=self.isCanceled)
+        if build is None:
+            return False
+
+        # Layers created here must live on the GUI thread before they join the project
+        main_thread = QCoreApplication.instance().thread()
+        for layer in build.layers():
+            layer.moveToThread(main_thread)
+        self.build = build
+        return True
+
+
+class ExportMapTask(MapTask):
+    """Render a layout to PNG/PDF off the GUI thread
+
+    The layout handed to the task should be a clone made on the GUI thread,
+    so the project copy stays free for the user to edit while rendering.
+    An optional ExportGeneralization swaps the clone's map layers for
+    simplified ones; the task keeps them alive until rendering is done.
+    """
+
+    def __init__(self, layout, targets, dpi, generalization=None, metrics=None, on_finished=None):
+        super().__init__(f'Export map: {layout.name()}', on_finished)
+        self.layout = layout
+        self.targets = targets
+        self.dpi = dpi
+        self.generalization = generalization
+        self.metrics = metrics
+        self.outputs = None
+
+    def run_stages(self):
+        self.outputs = export_outputs(
+            self.layout, self.targets, self.dpi,
+            progress=self.setProgress, is_canceled=self.isCanceled,
+            generalization=self.generalization, metrics=self.metrics
+        )
+        return self.outputs is not None
+
+
+class AtlasExportTask(MapTask):
+    """Render the pages of an atlas layout over a pool of threads"""
+
+    def __init__(self, layout, config, metrics=None, on_finished=None):
+        super().__init__(f'Export atlas: {config.title}', on_finished)
+        self.layout = layout
+        self.config = config
+        self.metrics = metrics
+        self.outputs = None
+
+    def run_stages(self):
+        self.outputs = export_atlas(
+            self.layout, self.config,
+            progress=self.setProgress, is_canceled=self.isCanceled, metrics=self.metrics
+        )
+        return self.outputs is not None
+
+
+class SeriesExportTask(MapTask):
+    """Render the frames of a time series from one layout"""
+
+    def __init__(self, series, metrics=None, on_finished=None):
+        super().__init__(f'Export series: {series.config.title}', on_finished)
+        self.series = series
+        self.metrics = metrics
+        self.outputs = None
+
+    def run_stages(self):
+        self.outputs = export_series(
+            self.series, progress=self.setProgress, is_canceled=self.isCanceled, metrics=self.metrics
+        )
+        return self.outputs is not None
+
+
+class WebExportTask(MapTask):
+    """Write the web map data and style of a build"""
+
+    def __init__(self, build, metrics=None, on_finished=None):
+        super().__init__(f'Export web map: {build.config.title}', on_finished)
+        self.build = build
+        self.metrics = metrics
+        self.outputs = None
+
+    def run_stages(self):
+        self.outputs = export_web(self.build, is_canceled=self.isCanceled, metrics=self.metrics)
+        return self.outputs is not None
+
+
+class BatchMapTask(MapTask):
+    """Run a batch of map jobs; rendering happens in worker processes"""
+
+    def __init__(self, config, jobs, workers=None, on_finished=None):
+        super().__init__(f'Myanmar map batch: {len(jobs)} maps', on_finished)
+        self.config = config
+        self.jobs = jobs
+        self.workers = workers
+        self.manifest = None
+
+    def run_stages(self):
+        self.manifest = run_batch(
+            self.config, self.jobs, workers=self.workers,
+            progress=self.setProgress, is_canceled=self.isCanceled
+        )
+        return self.manifest is not None
@@ -0,0 +1,290 @@
+"""
+Myanmar Map Generator - Time-series export
+
+One map per category column (e.g. Thematic23, Thematic24, Thematic25)
+from a single joined layer and a single layout. The columns are joined
+once, colours are assigned over the categories of all columns so they
+stay the same from frame to frame, and between frames only the renderer
+field, the labels and the title change. Frames are written as a PNG
+sequence, one multi-page PDF and an animated GIF (needs Pillow) or MP4
+(needs ffmpeg).
+"""
+
+from pathlib import Path
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from qgis.PyQt.QtCore import QMarginsF, QSize, QSizeF
+from qgis.PyQt.QtGui import QPageLayout, QPageSize, QPainter, QPdfWriter
+from qgis.core import (
+    QgsFeatureRequest, QgsLayerTree, QgsLayoutExporter, QgsLayoutItemLabel, QgsLayoutItemLegend
+)
+
+from .data_loader import load_table, sheet_key
+from .cache_utils import remove_file, temp_path
+from .map_basemap import with_basemap
+from .map_export import export_target, label_point_layer, placed_labels
+from .map_generalize import ExportGeneralization, uses_generalization
+from .map_labels import config_labeling
+from .map_join import join_columns
+from .map_metrics import noop, stage
+from .map_pipeline import (
+    build_layout, build_renderer, category_counts, category_palette, find_map_item
+)
+from .pcode_match import apply_fuzzy_match
+
+
+# Width of the GIF/MP4 frames in pixels
+ANIMATION_WIDTH = 1200
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]+')
+
+
+def parse_series(spec, label_col=''):
+    """[(category column, label column)] from 'Thematic23:IP_23, Thematic24:IP_24, ...'"""
+    frames = []
+    for item in filter(str.strip, spec.split(',')):
+        category, _, label = item.partition(':')
+        frames.append((category.strip(), label.strip() or label_col))
+    return frames
+
+
+def series_targets(config):
+    """Output paths of a series: {'png': [one per frame], 'pdf', 'gif', 'mp4'}"""
+    folder = Path(config.output_path)
+    base = config.title.replace(' ', '_')
+    frames = parse_series(config.series, config.label_col)
+    targets = {}
+    if config.export_png:
+        targets['png'] = [str(folder / f'{base}_{n:02d}_{_UNSAFE.sub("_", category)}.png')
+                          for n, (category, _) in enumerate(frames, start=1)]
+    for kind, wanted in (('pdf', config.export_pdf), ('gif', config.export_gif), ('mp4', config.export_mp4)):
+        if wanted:
+            targets[kind] = str(folder / f'{base}_series.{kind}')
+    return targets
+
+
+class SeriesExport:
+    """Layout and private layers of one series export
+
+    Create it on the GUI thread; export_series then only touches the
+    layout clone and the copies made here, so it can run in a task.
+    """
+
+    def __init__(self, build, project):
+        config = build.config
+        self.config = config
+        self.state_layer = build.state_layer
+        self.layout = build_layout(project, config.title, config.page_size, build.township_layer, build.state_layer)
+        self.layout.setName(f'{config.title} (series)')
+        self.source = build.township_layer
+        self.generalization = ExportGeneralization(build) if uses_generalization(config) else None
+
+    def layers(self):
+        """[townships, states] to draw; the township layer is a copy owned by this export"""
+        if self.generalization is not None:
+            layers = self.generalization.layers()
+            if layers:
+                return layers
+        townships = self.source.materialize(QgsFeatureRequest())
+        townships.setName(self.source.name())
+        return [townships, self.state_layer]
+
+
+def export_series(series, progress=None, is_canceled=None, metrics=None):
+    """Render every frame of a series; returns the written paths, or None if cancelled"""
+    progress = progress or noop
+    is_canceled = is_canceled or noop
+    config = series.config
+    frames = parse_series(config.series, config.label_col)
+    targets = series_targets(config)
+    if not frames or not targets:
+        return []
+
+    layout = series.layout
+    map_item = find_map_item(layout)
+    with stage(metrics, 'series_join', frames=len(frames)):
+        layers = series.layers()
+        townships = layers[0]
+        columns = [c for c in dict.fromkeys(c for frame in frames for c in frame) if c
+                   and townships.fields().indexOf(c) < 0]
+        if columns:
+            df = load_table(config.excel_path, columns=[config.pcode_excel, config.township_col] + columns,
+                            sheet_name=sheet_key(config.sheet))
+            df, _ = apply_fuzzy_match(config, townships, df)
+            join_columns(townships, df, config.pcode_shp, config.pcode_excel)
+
+    # Colours over the categories of every frame, so a category keeps its colour
+    counts = {category: category_counts(townships, category) for category, _ in frames}
+    palette = category_palette(set().union(*counts.values()))
+
+    map_item.setLayers(layers)
+    raster_layers = layers
+    if 'png' in targets or 'gif' in targets or 'mp4' in targets:
+        with stage(metrics, 'basemap') as record:
+            raster_layers = with_basemap(map_item, layers, config.dpi, record)
+
+    labels = {}
+    legend_roots = []
+    Path(config.output_path).mkdir(parents=True, exist_ok=True)
+    pdf = _PdfPages(targets['pdf'], layout, config.dpi) if 'pdf' in targets else None
+    work_dir = Path(tempfile.mkdtemp(prefix='.series_', dir=config.output_path or None))
+    outputs = []
+    try:
+        for n, (category, label_col) in enumerate(frames):
+            if is_canceled():
+                return None
+            with stage(metrics, 'series_frame', column=category):
+                townships.setRenderer(build_renderer(
+                    townships, category, config.multi_color, config.data_color, config.no_data_color,
+                    counts=counts[category], show_counts=config.show_counts, palette=palette
+                ))
+                label_layers = []
+                if config.show_labels and label_col:
+                    if label_col not in labels:
+                        labels[label_col] = _label_layer(map_item, townships, config, label_col)
+                    label_layers = [labels[label_col]]
+                _set_title(layout, f'{config.title} - {category}')
+                legend_roots.append(_set_legend(layout, layers))
+
+                if pdf is not None:
+                    map_item.setLayers(label_layers + layers)
+                    pdf.add_page()
+                map_item.setLayers(label_layers + raster_layers)
+                if 'png' in targets:
+                    path = targets['png'][n]
+                    if not export_target(layout, 'png', path, config.dpi, is_canceled):
+                        return None
+                    outputs.append(path)
+                if 'gif' in targets or 'mp4' in targets:
+                    _animation_frame(layout, work_dir / f'frame_{n:03d}.png')
+            progress(90 * (n + 1) / len(frames))
+
+        if pdf is not None:
+            outputs.append(pdf.close())
+            pdf = None
+        with stage(metrics, 'series_animation') as record:
+            if 'gif' in targets:
+                if write_gif(work_dir, targets['gif'], config.frame_seconds):
+                    outputs.append(targets['gif'])
+                else:
+                    record['gif'] = 'skipped: Pillow is not installed'
+            if 'mp4' in targets:
+                if write_mp4(work_dir, targets['mp4'], config.frame_seconds):
+                    outputs.append(targets['mp4'])
+                else:
+                    record['mp4'] = 'skipped: ffmpeg not found'
+    finally:
+        if pdf is not None:
+            pdf.abort()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    progress(100)
+    return outputs
+
+
+def _label_layer(map_item, townships, config, label_col):
+    """Fixed labels for one label column, placed once and reused by every frame"""
+    townships.setLabeling(config_labeling(config, townships, label_col))
+    townships.setLabelsEnabled(True)
+    positions = placed_labels(map_item, [townships], config.dpi) or {}
+    layer = label_point_layer(townships, positions.get(townships.id(), []), map_item.crs())
+    townships.setLabelsEnabled(False)
+    return layer
+
+
+def _set_title(layout, text):
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemLabel):
+            item.setText(text)
+
+
+def _set_legend(layout, layers):
+    """Point the legend at the export layers; returns the tree, which must stay alive"""
+    root = QgsLayerTree()
+    for layer in layers:
+        root.addLayer(layer)
+    for item in layout.items():
+        if isinstance(item, QgsLayoutItemLegend):
+            item.setAutoUpdateModel(False)
+            item.model().setRootGroup(root)
+            item.updateLegend()
+    return root
+
+
+def _animation_frame(layout, path):
+    page = layout.pageCollection().page(0).rect()
+    size = QSize(ANIMATION_WIDTH, round(ANIMATION_WIDTH * page.height() / page.width()))
+    image = QgsLayoutExporter(layout).renderPageToImage(0, size)
+    if not image.save(str(path), 'PNG'):
+        raise RuntimeError(f'Failed to write {path}')
+
+
+class _PdfPages:
+    """Multi-page PDF, one layout render per page, moved into place on close"""
+
+    def __init__(self, path, layout, dpi):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = temp_path(self.path)
+        self.layout = layout
+        page = layout.pageCollection().page(0).pageSize()
+        self.writer = QPdfWriter(str(self.tmp))
+        self.writer.setResolution(dpi)
+        self.writer.setPageLayout(QPageLayout(
+            QPageSize(QSizeF(page.width(), page.height()), QPageSize.Millimeter),
+            QPageLayout.Portrait, QMarginsF(0, 0, 0, 0)
+        ))
+        self.painter = None
+        self.pages = 0
+
+    def add_page(self):
+        if self.painter is None:
+            self.painter = QPainter(self.writer)
+        else:
+            self.writer.newPage()
+        QgsLayoutExporter(self.layout).renderPage(self.painter, 0)
+        self.pages += 1
+
+    def close(self):
+        if self.painter is not None:
+            self.painter.end()
+        os.replace(self.tmp, self.path)
+        return str(self.path)
+
+    def abort(self):
+        if self.painter is not None:
+            self.painter.end()
+        remove_file(self.tmp)
+
+
+def write_gif(frame_dir, path, frame_seconds):
+    """Animated GIF from the frame PNGs; False when Pillow is not available"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    frames = [Image.open(p).convert('RGB').quantize(colors=255) for p in sorted(Path(frame_dir).glob('frame_*.png'))]
+    if not frames:
+        return False
+    tmp = Path(frame_dir) / 'series.gif'
+    frames[0].save(tmp, save_all=True, append_images=frames[1:], duration=round(frame_seconds * 1000), loop=0)
+    shutil.move(str(tmp), path)
+    return True
+
+
+def write_mp4(frame_dir, path, frame_seconds):
+    """H.264 MP4 from the frame PNGs; False when ffmpeg is not on the PATH"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return False
+    tmp = Path(frame_dir) / 'series.mp4'
+    subprocess.run([
+        ffmpeg, '-y', '-loglevel', 'error', '-framerate', f'{1 / frame_seconds:.6f}',
+        '-i', str(Path(frame_dir) / 'frame_%03d.png'),
+        '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-r', '25', '-pix_fmt', 'yuv420p', str(tmp)
+    ], check=True, capture_output=True)
+    shutil.move(str(tmp), path)
+    return True
@@ -1,14 +1,16 @@
 """
 Myanmar Map Generator - Main Plugin Class
+
+Only this module is imported when QGIS starts. The dialog, and with it
+pandas and the map pipeline, is imported on first use, and the dialog
+is then kept for the rest of the session.
 """
 
-from qgis.PyQt.QtWidgets import QAction, QMessageBox
+from qgis.PyQt.QtWidgets import QAction
 from qgis.PyQt.QtGui import QIcon
 from pathlib import Path
 import os
 
-from .myanmar_map_dialog import MyanmarMapDialog
-
 
 class MyanmarMapPlugin:
     def __init__(self, iface):
@@ -36,8 +38,17 @@ class MyanmarMapPlugin:
         """Remove plugin from QGIS"""
         self.iface.removePluginMenu('Myanmar Map Generator', self.action)
         self.iface.removeToolBarIcon(self.action)
+        if self.dialog is not None:
+            self.dialog.detach_tasks()
+            self.dialog.close()
+            self.dialog.deleteLater()
+            self.dialog = None
 
     def run(self):
-        """Run the plugin dialog"""
-        self.dialog = MyanmarMapDialog(self.iface)
+        """Show the plugin dialog, creating it on first use"""
+        if self.dialog is None:
+            from .myanmar_map_dialog import MyanmarMapDialog
+            self.dialog = MyanmarMapDialog(self.iface)
         self.dialog.show()
+        self.dialog.raise_()
+        self.dialog.activateWindow()
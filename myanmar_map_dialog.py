@@ -10,28 +10,20 @@ from qgis.PyQt.QtWidgets import (
 )
 from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtGui import QColor
-from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsField,
-    QgsCategorizedSymbolRenderer, QgsSymbol, QgsRendererCategory,
-    QgsPalLayerSettings, QgsTextFormat, QgsVectorLayerSimpleLabeling,
-    QgsPrintLayout, QgsLayoutExporter, QgsLayoutItemMap,
-    QgsLayoutItemLegend, QgsLayoutItemLabel, QgsLayoutSize,
-    QgsUnitTypes, QgsLayoutPoint
-)
-from qgis.PyQt.QtCore import QVariant
-from qgis.PyQt.QtGui import QFont
+from qgis.core import QgsApplication, QgsProject, QgsTask
 from pathlib import Path
-import pandas as pd
 import os
 
-
-COLORS = [
-    '#e74c3c', '#3498db', '#2ecc71', '#f39c12', '#9b59b6',
-    '#1abc9c', '#34495e', '#e67e22', '#95a5a6', '#16a085',
-    '#27ae60', '#2980b9', '#8e44ad', '#c0392b', '#d35400',
-    '#7f8c8d', '#bdc3c7', '#ecf0f1', '#f1c40f', '#e8daef',
-    '#d5f4e6', '#fdebd0', '#fadbd8', '#d6eaf8', '#ebf5fb'
-]
+from .data_loader import DATA_FILE_FILTER, list_sheets, read_columns, sheet_key
+from .map_batch import load_jobs
+from .map_atlas import atlas_layout
+from .map_config import MapConfig
+from .map_core import add_to_project, output_groups, output_targets, prepare_export
+from .map_session import MapSession
+from .map_metrics import RunMetrics
+from .map_tasks import AtlasExportTask, BatchMapTask, BuildMapTask, ExportMapTask, SeriesExportTask, WebExportTask
+from .map_timeseries import SeriesExport
+from .output_cache import OutputCache
 
 
 class MyanmarMapDialog(QDialog):
@@ -42,10 +34,15 @@ class MyanmarMapDialog(QDialog):
         self.setMinimumWidth(500)
         self.setMinimumHeight(600)
 
-        self.excel_df = None
         self.data_color = '#1abc9c'
         self.no_data_color = '#f0f0f0'
 
+        self.session = MapSession()
+        self._tasks = []
+        self._exports = []
+        self._pending = []
+        self._records = {}
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -82,14 +79,21 @@ class MyanmarMapDialog(QDialog):
         excel_layout = QHBoxLayout()
         excel_layout.addWidget(QLabel('Excel Data:'))
         self.excel_path = QLineEdit()
-        self.excel_path.setPlaceholderText('Select Excel file...')
-        self.excel_path.textChanged.connect(self.load_excel_columns)
+        self.excel_path.setPlaceholderText('Select Excel, CSV or Parquet file...')
+        self.excel_path.textChanged.connect(self.load_excel_sheets)
         excel_layout.addWidget(self.excel_path)
         excel_btn = QPushButton('Browse')
         excel_btn.clicked.connect(lambda: self.browse_file(self.excel_path, 'xlsx'))
         excel_layout.addWidget(excel_btn)
         data_layout.addLayout(excel_layout)
 
+        sheet_layout = QHBoxLayout()
+        sheet_layout.addWidget(QLabel('Sheet:'))
+        self.sheet = QComboBox()
+        self.sheet.currentTextChanged.connect(self.load_excel_columns)
+        sheet_layout.addWidget(self.sheet)
+        data_layout.addLayout(sheet_layout)
+
         data_group.setLayout(data_layout)
         layout.addWidget(data_group)
 
@@ -111,6 +115,10 @@ class MyanmarMapDialog(QDialog):
         pcode_excel_layout.addWidget(self.pcode_excel)
         column_layout.addLayout(pcode_excel_layout)
 
+        self.fuzzy_match = QCheckBox('Match P_Code typos and township names automatically')
+        self.fuzzy_match.setChecked(True)
+        column_layout.addWidget(self.fuzzy_match)
+
         # Category column
         category_layout = QHBoxLayout()
         category_layout.addWidget(QLabel('Category Column:'))
@@ -132,6 +140,19 @@ class MyanmarMapDialog(QDialog):
         label_layout.addWidget(self.label_col)
         column_layout.addLayout(label_layout)
 
+        # Admin level the data is rolled up to
+        level_layout = QHBoxLayout()
+        level_layout.addWidget(QLabel('Map Level:'))
+        self.level = QComboBox()
+        for text, level in (('Township', 'township'), ('District', 'district'), ('State/Region', 'state')):
+            self.level.addItem(text, level)
+        level_layout.addWidget(self.level)
+        self.aggregations = QLineEdit()
+        self.aggregations.setPlaceholderText('Default: mode of category, township count as label')
+        self.aggregations.setToolTip('name=func(column[, value]) separated by ";", func: count, sum, share, mode')
+        level_layout.addWidget(self.aggregations)
+        column_layout.addLayout(level_layout)
+
         column_group.setLayout(column_layout)
         layout.addWidget(column_group)
 
@@ -162,6 +183,9 @@ class MyanmarMapDialog(QDialog):
         color_picker_layout.addWidget(self.no_data_color_btn)
 
         color_layout.addLayout(color_picker_layout)
+
+        self.show_counts = QCheckBox('Show township counts in legend')
+        color_layout.addWidget(self.show_counts)
         color_group.setLayout(color_layout)
         layout.addWidget(color_group)
 
@@ -186,6 +210,13 @@ class MyanmarMapDialog(QDialog):
         self.label_size.setRange(4, 14)
         self.label_size.setValue(7)
         label_settings_layout.addWidget(self.label_size)
+        self.label_anchors = QCheckBox('Anchor inside townships')
+        self.label_anchors.setChecked(True)
+        self.label_anchors.setToolTip('Place labels around a precomputed point inside each township (faster)')
+        label_settings_layout.addWidget(self.label_anchors)
+        self.label_obstacles = QCheckBox('Avoid covering townships')
+        self.label_obstacles.setToolTip('Treat townships as obstacles; slower and drops more labels on dense maps')
+        label_settings_layout.addWidget(self.label_obstacles)
         map_layout.addLayout(label_settings_layout)
 
         # Page size
@@ -225,11 +256,53 @@ class MyanmarMapDialog(QDialog):
         self.export_pdf.setChecked(True)
         export_layout.addWidget(self.export_png)
         export_layout.addWidget(self.export_pdf)
+        self.export_web = QCheckBox('Export web map')
+        self.export_web.setToolTip('Simplified TopoJSON of the joined layer plus a style JSON, for web dashboards')
+        export_layout.addWidget(self.export_web)
         output_layout.addLayout(export_layout)
 
+        self.reuse_outputs = QCheckBox('Skip outputs that are already up to date')
+        self.reuse_outputs.setChecked(True)
+        output_layout.addWidget(self.reuse_outputs)
+
+        atlas_row = QHBoxLayout()
+        self.export_atlas = QCheckBox('Also one map per State/Region (atlas), name field:')
+        atlas_row.addWidget(self.export_atlas)
+        self.atlas_field = QLineEdit('ST')
+        atlas_row.addWidget(self.atlas_field)
+        output_layout.addLayout(atlas_row)
+
+        series_row = QHBoxLayout()
+        series_row.addWidget(QLabel('Time series (column:label, ...):'))
+        self.series = QLineEdit()
+        self.series.setPlaceholderText('Thematic23:IP_23, Thematic24:IP_24, Thematic25:IP_25')
+        series_row.addWidget(self.series)
+        output_layout.addLayout(series_row)
+
+        self.profile_run = QCheckBox('Profile runs (cProfile + tracemalloc, slower)')
+        output_layout.addWidget(self.profile_run)
+
         output_group.setLayout(output_layout)
         layout.addWidget(output_group)
 
+        # ===== PROGRESS =====
+        progress_layout = QHBoxLayout()
+        self.progress_label = QLabel('Idle')
+        progress_layout.addWidget(self.progress_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_btn = QPushButton('Cancel')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_tasks)
+        progress_layout.addWidget(self.cancel_btn)
+        layout.addLayout(progress_layout)
+
+        self.metrics_label = QLabel('')
+        self.metrics_label.setWordWrap(True)
+        self.metrics_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.metrics_label)
+
         # ===== BUTTONS =====
         button_layout = QHBoxLayout()
 
@@ -242,6 +315,10 @@ class MyanmarMapDialog(QDialog):
         self.generate_btn.setStyleSheet('background-color: #27ae60; color: white; font-weight: bold;')
         button_layout.addWidget(self.generate_btn)
 
+        self.batch_btn = QPushButton('Run Batch...')
+        self.batch_btn.clicked.connect(self.run_batch)
+        button_layout.addWidget(self.batch_btn)
+
         self.close_btn = QPushButton('Close')
         self.close_btn.clicked.connect(self.close)
         button_layout.addWidget(self.close_btn)
@@ -276,7 +353,7 @@ class MyanmarMapDialog(QDialog):
         if file_type == 'shp':
             path, _ = QFileDialog.getOpenFileName(self, 'Select Shapefile', '', 'Shapefiles (*.shp)')
         else:
-            path, _ = QFileDialog.getOpenFileName(self, 'Select Excel File', '', 'Excel Files (*.xlsx *.xls)')
+            path, _ = QFileDialog.getOpenFileName(self, 'Select Data File', '', DATA_FILE_FILTER)
         if path:
             line_edit.setText(path)
 
@@ -286,15 +363,30 @@ class MyanmarMapDialog(QDialog):
         if path:
             self.output_path.setText(path)
 
+    def load_excel_sheets(self):
+        """List the sheets of the data file, then load its columns"""
+        excel_path = self.excel_path.text()
+        self.sheet.blockSignals(True)
+        self.sheet.clear()
+        if excel_path and Path(excel_path).exists():
+            try:
+                sheets = list_sheets(excel_path)
+            except Exception:
+                sheets = []
+            # Formats without sheets report a single unnamed one
+            self.sheet.addItems([s for s in sheets if isinstance(s, str)])
+        self.sheet.setEnabled(self.sheet.count() > 1)
+        self.sheet.blockSignals(False)
+        self.load_excel_columns()
+
     def load_excel_columns(self):
-        """Load columns from Excel file"""
+        """Load columns from the selected sheet of the data file"""
         excel_path = self.excel_path.text()
         if not excel_path or not Path(excel_path).exists():
             return
 
         try:
-            self.excel_df = pd.read_excel(excel_path)
-            columns = list(self.excel_df.columns)
+            columns = read_columns(excel_path, sheet_key(self.sheet.currentText()))
 
             # Update combo boxes
             for combo in [self.pcode_excel, self.category_col, self.township_col, self.label_col]:
@@ -327,206 +419,269 @@ class MyanmarMapDialog(QDialog):
                 self.no_data_color = hex_color
                 self.no_data_color_btn.setStyleSheet(f'background-color: {hex_color}')
 
+    def collect_config(self):
+        """Snapshot the widget values into a MapConfig"""
+        return MapConfig(
+            state_path=self.state_path.text(),
+            township_path=self.township_path.text(),
+            excel_path=self.excel_path.text(),
+            sheet=self.sheet.currentText(),
+            pcode_shp=self.pcode_shp.text(),
+            pcode_excel=self.pcode_excel.currentText(),
+            fuzzy_match=self.fuzzy_match.isChecked(),
+            category_col=self.category_col.currentText(),
+            township_col=self.township_col.currentText(),
+            label_col=self.label_col.currentText(),
+            level=self.level.currentData(),
+            aggregations=self.aggregations.text(),
+            multi_color=self.multi_color_radio.isChecked(),
+            data_color=self.data_color,
+            no_data_color=self.no_data_color,
+            show_counts=self.show_counts.isChecked(),
+            title=self.title_edit.text(),
+            show_labels=self.show_labels.isChecked(),
+            label_size=self.label_size.value(),
+            label_anchors=self.label_anchors.isChecked(),
+            label_obstacles=self.label_obstacles.isChecked(),
+            page_size=self.page_size.currentText(),
+            dpi=self.dpi.value(),
+            output_path=self.output_path.text(),
+            export_png=self.export_png.isChecked(),
+            export_pdf=self.export_pdf.isChecked(),
+            export_web=self.export_web.isChecked(),
+            reuse_outputs=self.reuse_outputs.isChecked(),
+            atlas=self.export_atlas.isChecked(),
+            atlas_field=self.atlas_field.text(),
+            series=self.series.text(),
+            profile=self.profile_run.isChecked(),
+        )
+
     def preview_map(self):
         """Generate map preview in QGIS canvas"""
-        try:
-            self.create_map(export=False)
-            QMessageBox.information(self, 'Success', 'Map preview generated! Check the QGIS canvas.')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', f'Failed to generate preview: {e}')
+        self.start_run(export=False)
 
     def generate_map(self):
         """Generate map and export"""
+        self.start_run(export=True)
+
+    def run_batch(self):
+        """Generate one map per job listed in a JSON/CSV jobs file"""
+        path, _ = QFileDialog.getOpenFileName(self, 'Select Batch Jobs', '', 'Batch Jobs (*.json *.csv)')
+        if not path:
+            return
+        try:
+            jobs = load_jobs(path)
+        except Exception as e:
+            QMessageBox.warning(self, 'Error', f'Failed to read batch jobs: {e}')
+            return
+        if not jobs:
+            return
+        task = BatchMapTask(self.collect_config(), jobs, on_finished=self.on_batch_finished)
+        self.add_task(task)
+
+    def on_batch_finished(self, task, ok):
+        """Report a finished batch run"""
+        self.task_done(task)
+        if ok:
+            failed = [j for j in task.manifest['jobs'] if j['status'] not in ('ok', 'skipped')]
+            skipped = [j for j in task.manifest['jobs'] if j['status'] == 'skipped']
+            exported = len(task.jobs) - len(failed) - len(skipped)
+            message = f'Batch finished: {exported} of {len(task.jobs)} maps exported, ' \
+                      f'{len(skipped)} already up to date. Manifest: {task.manifest["path"]}'
+            if failed:
+                self.iface.messageBar().pushWarning('Myanmar Map Generator', message)
+            else:
+                self.iface.messageBar().pushSuccess('Myanmar Map Generator', message)
+        elif task.exception is not None:
+            QMessageBox.critical(self, 'Error', f'Failed to run batch: {task.exception}')
+
+    def start_run(self, export=False):
+        """Run the map, re-executing only the stages the settings changes affect"""
+        config = self.collect_config()
+        self.schedule(lambda: self.apply_config(config, export))
+
+    def schedule(self, step):
+        """Run a project-changing step now, or after the running exports finish"""
+        # Layers in use by a running export stay untouched until it finishes
+        if self._exports:
+            self._pending.append(step)
+        else:
+            step()
+
+    def apply_config(self, config, export):
+        """Update the cached session layers, or queue a full background build"""
+        stages = self.session.plan(config, QgsProject.instance())
+        if 'load' in stages:
+            task = BuildMapTask(config, on_finished=lambda t, ok: self.on_build_finished(t, ok, export))
+            self.add_task(task)
+            return
         try:
-            self.create_map(export=True)
-            QMessageBox.information(self, 'Success', 'Map generated and exported successfully!')
+            build = self.session.update(config, stages)
         except Exception as e:
-            QMessageBox.critical(self, 'Error', f'Failed to generate map: {e}')
+            QMessageBox.critical(self, 'Error', f'Failed to update map: {e}')
+            return
+        self.finish_run(build, export)
+
+    def add_task(self, task):
+        """Track a task in the progress bar and hand it to the task manager"""
+        self._tasks.append(task)
+        task.progressChanged.connect(lambda value, t=task: self.show_progress(t, value))
+        self.show_progress(task, 0)
+        QgsApplication.taskManager().addTask(task)
+
+    def show_progress(self, task, value):
+        """Show progress of the most recent task"""
+        active = [t for t in self._tasks if t.status() not in (QgsTask.Complete, QgsTask.Terminated)]
+        self.progress_bar.setValue(int(value))
+        self.progress_label.setText(f'{task.description()} ({len(active)} running)' if active else 'Idle')
+        self.cancel_btn.setEnabled(bool(active))
+
+    def cancel_tasks(self):
+        """Cancel every queued or running task of this dialog"""
+        for task in self._tasks:
+            task.cancel()
+
+    def detach_tasks(self):
+        """Cancel every task and drop its callbacks into this dialog, before it is deleted
+
+        Cancelled tasks can still finish later; they must not call back
+        into a deleted dialog.
+        """
+        for task in self._tasks:
+            task.on_finished = None
+            try:
+                task.progressChanged.disconnect()
+            except TypeError:
+                pass
+            task.cancel()
+            if getattr(task, 'metrics', None) is not None:
+                task.metrics.close()
+        self._tasks.clear()
+        self._exports.clear()
+        self._pending.clear()
+        self._records.clear()
+
+    def task_done(self, task):
+        self._tasks.remove(task)
+        self.show_progress(task, 100 if self._tasks else 0)
+
+    def on_build_finished(self, task, ok, export):
+        """Apply the layers of a finished build (GUI thread)"""
+        self.task_done(task)
+        if not ok:
+            if task.exception is not None:
+                action = 'generate map' if export else 'generate preview'
+                QMessageBox.critical(self, 'Error', f'Failed to {action}: {task.exception}')
+            return
+        self.schedule(lambda: self.apply_map(task.build, export))
 
-    def create_map(self, export=False):
-        """Create the map"""
+    def apply_map(self, build, export):
+        """Replace the project layers with a full build"""
         project = QgsProject.instance()
         project.clear()
+        add_to_project(build, project)
+        self.session.adopt(build)
+        self.finish_run(build, export)
 
-        # Load Excel
-        df = pd.read_excel(self.excel_path.text())
-        pcode_excel = self.pcode_excel.currentText()
-        df[pcode_excel] = df[pcode_excel].astype(str).str.strip().str.upper()
-
-        excel_fields = [c for c in df.columns if c != pcode_excel]
-        lookup = df.set_index(pcode_excel).to_dict('index')
-
-        # Load shapefiles
-        state_layer = QgsVectorLayer(self.state_path.text(), 'States', 'ogr')
-        township_layer = QgsVectorLayer(self.township_path.text(), 'Townships', 'ogr')
-
-        pcode_shp = self.pcode_shp.text()
-
-        # Add fields and join
-        township_layer.startEditing()
-        existing = [f.name() for f in township_layer.fields()]
-        for field in excel_fields:
-            if field not in existing:
-                township_layer.addAttribute(QgsField(field, QVariant.String))
-        township_layer.updateFields()
-
-        for feature in township_layer.getFeatures():
-            pcode = str(feature[pcode_shp]).strip().upper()
-            if pcode in lookup:
-                for field in excel_fields:
-                    val = lookup[pcode].get(field, '')
-                    feature[field] = str(val) if pd.notna(val) else ''
-                township_layer.updateFeature(feature)
-        township_layer.commitChanges()
-
-        # Style state layer BEFORE adding to project
-        state_symbol = QgsSymbol.defaultSymbol(state_layer.geometryType())
-        state_symbol.setColor(QColor(255, 255, 255, 0))
-        state_symbol.symbolLayer(0).setStrokeColor(QColor('#a8a5a5'))
-        state_symbol.symbolLayer(0).setStrokeWidth(0.5)
-        state_layer.renderer().setSymbol(state_symbol)
-        state_layer.triggerRepaint()
-
-        # Add layers: States first (bottom), Townships second (top)
-        project.addMapLayer(state_layer)
-        project.addMapLayer(township_layer)
-
-        # Apply colors
-        category_col = self.category_col.currentText()
-        is_multi_color = self.multi_color_radio.isChecked()
-
-        if is_multi_color:
-            categories = set()
-            for f in township_layer.getFeatures():
-                val = f[category_col]
-                categories.add(str(val) if val else 'NA')
-
-            cat_list = []
-            for i, cat in enumerate(sorted(categories)):
-                symbol = QgsSymbol.defaultSymbol(township_layer.geometryType())
-                symbol.setColor(QColor(COLORS[i % len(COLORS)]))
-                symbol.setOpacity(0.8)
-                symbol.symbolLayer(0).setStrokeColor(QColor('#ffffff'))
-                symbol.symbolLayer(0).setStrokeWidth(0.3)
-                cat_list.append(QgsRendererCategory(cat, symbol, cat))
-
-            township_layer.setRenderer(QgsCategorizedSymbolRenderer(category_col, cat_list))
-        else:
-            # Binary mode
-            cat_list = []
-            for cat_type in ['Has Data', 'No Data']:
-                symbol = QgsSymbol.defaultSymbol(township_layer.geometryType())
-                color = self.data_color if cat_type == 'Has Data' else self.no_data_color
-                symbol.setColor(QColor(color))
-                symbol.setOpacity(0.8)
-                symbol.symbolLayer(0).setStrokeColor(QColor('#ffffff'))
-                symbol.symbolLayer(0).setStrokeWidth(0.3)
-                cat_list.append(QgsRendererCategory(cat_type, symbol, cat_type))
-
-            # Update category field for binary
-            township_layer.startEditing()
-            for feature in township_layer.getFeatures():
-                val = feature[category_col]
-                binary_val = 'Has Data' if val and str(val) != 'NA' and str(val).strip() else 'No Data'
-                feature[category_col] = binary_val
-                township_layer.updateFeature(feature)
-            township_layer.commitChanges()
-
-            township_layer.setRenderer(QgsCategorizedSymbolRenderer(category_col, cat_list))
-
-        # Apply labels
-        if self.show_labels.isChecked():
-            settings = QgsPalLayerSettings()
-            fmt = QgsTextFormat()
-            fmt.setFont(QFont('Arial', self.label_size.value()))
-            fmt.setSize(self.label_size.value())
-            fmt.buffer().setEnabled(True)
-            fmt.buffer().setSize(0.5)
-            settings.setFormat(fmt)
-
-            township_col = self.township_col.currentText()
-            label_col = self.label_col.currentText()
-            settings.fieldName = f'"{township_col}" || \' - \' || "{label_col}"'
-            settings.isExpression = True
-            settings.enabled = True
-            township_layer.setLabeling(QgsVectorLayerSimpleLabeling(settings))
-            township_layer.setLabelsEnabled(True)
-
-        # Refresh canvas
-        self.iface.mapCanvas().setExtent(township_layer.extent())
+    def finish_run(self, build, export):
+        """Refresh the canvas and optionally start the export"""
+        project = QgsProject.instance()
+        self.iface.mapCanvas().setExtent(build.township_layer.extent())
         self.iface.mapCanvas().refresh()
 
-        # Export
-        if export and (self.export_png.isChecked() or self.export_pdf.isChecked()):
-            self.export_map(project, township_layer, state_layer)
-
-    def export_map(self, project, township_layer, state_layer):
-        """Export map to PNG/PDF"""
-        output_folder = Path(self.output_path.text())
-        output_folder.mkdir(exist_ok=True)
+        report = build.join_report
+        if not report.ok:
+            self.iface.messageBar().pushWarning('Myanmar Map Generator', report.summary().replace('\n', ' '))
 
-        # Create layout
-        layout = QgsPrintLayout(project)
-        layout.initializeDefaults()
-        layout.setName(self.title_edit.text())
-
-        # Page size
-        page_sizes = {
-            'A3': QgsLayoutSize(297, 420, QgsUnitTypes.LayoutMillimeters),
-            'A4': QgsLayoutSize(210, 297, QgsUnitTypes.LayoutMillimeters),
-        }
-        page = layout.pageCollection().page(0)
-        page.setPageSize(page_sizes.get(self.page_size.currentText(), page_sizes['A4']))
+        if not export:
+            self.report_metrics(build.metrics)
+            self.iface.messageBar().pushSuccess('Myanmar Map Generator', 'Map preview generated! Check the QGIS canvas.')
+            return
 
-        pw = page.pageSize().width()
-        ph = page.pageSize().height()
-        margin = 10
+        config = build.config
+        cache = OutputCache(config.output_path) if config.reuse_outputs else None
+        targets = output_targets(config)
+        stale = cache.stale_targets(config, targets) if cache else targets
+        groups = [g for g in output_groups(config) if cache is None or cache.group_outputs(config, g) is None]
+        if not stale and not groups:
+            self.report_metrics(build.metrics, reused=len(targets))
+            if targets or output_groups(config):
+                self.iface.messageBar().pushInfo('Myanmar Map Generator',
+                                                 'Outputs are already up to date; nothing was exported.')
+            return
 
-        # Title
-        title = QgsLayoutItemLabel(layout)
-        title.setText(self.title_edit.text())
-        title.setFont(QFont('Arial', 18, QFont.Bold))
-        title.attemptMove(QgsLayoutPoint(margin, margin, QgsUnitTypes.LayoutMillimeters))
-        title.attemptResize(QgsLayoutSize(pw - 2*margin, 12, QgsUnitTypes.LayoutMillimeters))
-        layout.addLayoutItem(title)
-
-        # Map
-        legend_height = 60
-        map_height = ph - 25 - legend_height - margin
-        map_width = pw - 2*margin
-
-        map_item = QgsLayoutItemMap(layout)
-        map_item.attemptMove(QgsLayoutPoint(margin, 25, QgsUnitTypes.LayoutMillimeters))
-        map_item.attemptResize(QgsLayoutSize(map_width, map_height, QgsUnitTypes.LayoutMillimeters))
-        map_item.setExtent(township_layer.extent())
-        map_item.setLayers([township_layer, state_layer])
-        map_item.refresh()
-        layout.addLayoutItem(map_item)
-
-        # Legend
-        legend = QgsLayoutItemLegend(layout)
-        legend.setLinkedMap(map_item)
-        legend.setTitle('Legend')
-        legend.attemptMove(QgsLayoutPoint(margin, ph - legend_height - margin, QgsUnitTypes.LayoutMillimeters))
-        legend.attemptResize(QgsLayoutSize(pw - 2*margin, legend_height, QgsUnitTypes.LayoutMillimeters))
-        legend.updateLegend()
-        layout.addLayoutItem(legend)
-
-        project.layoutManager().addLayout(layout)
-
-        # Export
-        filename = self.title_edit.text().replace(' ', '_')
-        exporter = QgsLayoutExporter(layout)
-        dpi = self.dpi.value()
-
-        if self.export_png.isChecked():
-            png_path = str(output_folder / f'{filename}.png')
-            settings = QgsLayoutExporter.ImageExportSettings()
-            settings.dpi = dpi
-            exporter.exportToImage(png_path, settings)
-
-        if self.export_pdf.isChecked():
-            pdf_path = str(output_folder / f'{filename}.pdf')
-            settings = QgsLayoutExporter.PdfExportSettings()
-            settings.dpi = dpi
-            exporter.exportToPdf(pdf_path, settings)
+        if stale:
+            layout, export_layout, generalization = prepare_export(build, project)
+            self.replace_layout(layout)
+            export_task = ExportMapTask(export_layout, stale, config.dpi, generalization=generalization,
+                                        metrics=build.metrics, on_finished=self.on_export_finished)
+            if cache:
+                self._records[export_task] = lambda outputs: cache.record_targets(config, stale)
+            self._exports.append(export_task)
+            self.add_task(export_task)
+        else:
+            self.report_metrics(build.metrics, reused=len(targets))
+
+        for group in groups:
+            metrics = RunMetrics.for_config(config, kind=group)
+            if group == 'atlas':
+                layout = atlas_layout(build, project)
+                self.replace_layout(layout)
+                task = AtlasExportTask(layout.clone(), config, metrics=metrics, on_finished=self.on_export_finished)
+            elif group == 'web':
+                task = WebExportTask(build, metrics=metrics, on_finished=self.on_export_finished)
+            else:
+                task = SeriesExportTask(SeriesExport(build, project), metrics=metrics,
+                                        on_finished=self.on_export_finished)
+            if cache:
+                self._records[task] = lambda outputs, group=group: cache.record_group(config, group, outputs)
+            self._exports.append(task)
+            self.add_task(task)
+
+    def replace_layout(self, layout):
+        """Add a layout to the project, replacing one with the same name"""
+        manager = QgsProject.instance().layoutManager()
+        previous = manager.layoutByName(layout.name())
+        if previous is not None:
+            manager.removeLayout(previous)
+        manager.addLayout(layout)
+
+    def report_metrics(self, metrics, **extra):
+        """Log a finished run and show its stage timings under the progress bar"""
+        if metrics is None:
+            return
+        try:
+            metrics.finish(**extra)
+        except OSError as e:
+            self.metrics_label.setText(f'Last run: {metrics.summary()} (log not written: {e})')
+            return
+        text = f'Last run: {metrics.summary()}'
+        if metrics.profile_path is not None:
+            text += f'\nProfile: {metrics.profile_path}'
+        self.metrics_label.setText(text)
+        self.metrics_label.setToolTip(f'Run log: {metrics.log_path}')
+
+    def on_export_finished(self, task, ok):
+        """Report a finished export and apply any runs queued behind it"""
+        self.task_done(task)
+        self._exports.remove(task)
+        record = self._records.pop(task, None)
+        if ok and record is not None:
+            try:
+                record(task.outputs)
+            except OSError as e:
+                self.iface.messageBar().pushWarning('Myanmar Map Generator', f'Output manifest not written: {e}')
+        self.report_metrics(task.metrics, outputs=task.outputs)
+        if ok and isinstance(task, AtlasExportTask):
+            self.iface.messageBar().pushSuccess('Myanmar Map Generator', f'Atlas exported: {len(task.outputs)} files.')
+        elif ok and isinstance(task, SeriesExportTask):
+            self.iface.messageBar().pushSuccess('Myanmar Map Generator', f'Series exported: {len(task.outputs)} files.')
+        elif ok and isinstance(task, WebExportTask):
+            self.iface.messageBar().pushSuccess('Myanmar Map Generator', f'Web map exported: {task.outputs[0]}')
+        elif ok:
+            self.iface.messageBar().pushSuccess('Myanmar Map Generator', 'Map generated and exported successfully!')
+        elif task.exception is not None:
+            QMessageBox.critical(self, 'Error', f'Failed to generate map: {task.exception}')
+
+        while self._pending and not self._exports:
+            self._pending.pop(0)()
@@ -0,0 +1,149 @@
+"""
+Myanmar Map Generator - Output cache
+
+Each export is keyed by a hash of the input file contents and every
+setting that affects the rendering. Keys are kept in a manifest in the
+output folder; an output whose key matches and whose files are still
+exactly as written is not rendered again.
+"""
+
+from dataclasses import fields
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+
+from qgis.core import Qgis
+
+from .cache_utils import atomic_write, content_hash, dataset_files, plugin_version
+from .map_config import MapConfig
+
+
+MANIFEST_NAME = '.myanmar_map_outputs.json'
+
+# Settings that only say where or whether to write, not what is drawn
+NON_RENDER_FIELDS = ('output_path', 'export_png', 'export_pdf', 'export_web', 'reuse_outputs', 'profile')
+# Settings read by one group of outputs only; every other output ignores them
+GROUP_FIELDS = {
+    'atlas': ('atlas', 'atlas_field', 'atlas_filename'),
+    'series': ('series', 'export_gif', 'export_mp4', 'frame_seconds'),
+    'web': ('web_format', 'web_tolerance'),
+}
+# Page layout settings, which web maps do not use
+LAYOUT_FIELDS = ('page_size', 'dpi', 'generalize', 'label_size', 'label_anchors', 'label_candidates',
+                 'label_obstacles', 'label_priority')
+# Groups written in the PNG/PDF formats chosen for the single map
+PAGE_GROUPS = ('atlas', 'series')
+
+_lock = threading.Lock()
+
+
+def input_files(config):
+    """Every file the rendering of a config reads"""
+    files = dataset_files(config.state_path) + dataset_files(config.township_path)
+    if config.district_path:
+        files += dataset_files(config.district_path)
+    return files + [Path(config.excel_path)]
+
+
+def render_fields(group=None):
+    """Names of the settings an output reads: the single map, or one group of outputs"""
+    ignored = set(NON_RENDER_FIELDS) | {'state_path', 'township_path', 'district_path', 'excel_path'}
+    for name, names in GROUP_FIELDS.items():
+        if name != group:
+            ignored.update(names)
+    if group == 'web':
+        ignored.update(LAYOUT_FIELDS)
+    return [f.name for f in fields(MapConfig) if f.name not in ignored]
+
+
+def render_key(config, kind, group=None):
+    """Hash of the input contents, the settings the output reads and the output kind"""
+    settings = {name: getattr(config, name) for name in render_fields(group)}
+    digest = hashlib.sha1()
+    for part in (content_hash(*input_files(config)), json.dumps(settings, sort_keys=True, default=str),
+                 kind, plugin_version(), Qgis.QGIS_VERSION):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def group_entry(config, group):
+    """Manifest entry grouping the files of a multi-file output (atlas, series, web)"""
+    return f'{group}:{config.title}'
+
+
+def _group_key(config, group):
+    kinds = [kind for kind in ('png', 'pdf') if group in PAGE_GROUPS and getattr(config, f'export_{kind}')]
+    return render_key(config, f'{group}:' + ','.join(kinds), group)
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class OutputCache:
+    """Manifest of rendered outputs in one folder"""
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.path = self.folder / MANIFEST_NAME
+        try:
+            self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_fresh(self, name, key):
+        """True if entry name was written with key and its files are unchanged"""
+        entry = self.entries.get(name)
+        if not entry or entry.get('key') != key:
+            return False
+        for file_name, state in entry.get('files', {}).items():
+            try:
+                if _file_state(self.folder / file_name) != state:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def stale_targets(self, config, targets):
+        """The (kind, path) targets that need rendering"""
+        return [(kind, path) for kind, path in targets
+                if not self.is_fresh(Path(path).name, render_key(config, kind))]
+
+    def group_outputs(self, config, group):
+        """Paths of a fresh group of files for config, or None if it needs rendering"""
+        name = group_entry(config, group)
+        if not self.is_fresh(name, _group_key(config, group)):
+            return None
+        return [str(self.folder / file_name) for file_name in self.entries[name]['files']]
+
+    def record_group(self, config, group, paths):
+        self.record(group_entry(config, group), _group_key(config, group), paths)
+        self.save()
+
+    def record(self, name, key, paths):
+        self.entries[name] = {
+            'key': key,
+            'files': {Path(p).name: _file_state(p) for p in paths},
+        }
+
+    def record_targets(self, config, targets):
+        """Remember freshly written targets and save the manifest"""
+        for kind, path in targets:
+            self.record(Path(path).name, render_key(config, kind), [path])
+        self.save()
+
+    def save(self):
+        """Merge into the manifest on disk and replace it atomically"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with _lock:
+            try:
+                current = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                current = {}
+            current.update(self.entries)
+            atomic_write(self.path, json.dumps(current, indent=2, sort_keys=True))
+            self.entries = current
@@ -0,0 +1,310 @@
+"""
+Myanmar Map Generator - Fuzzy P_Code and name matching
+
+Data rows whose P_Code has no exact match in the township layer are
+looked up in a trigram index of the layer's P_Codes and names. Only
+townships sharing a selective trigram with the query are scored, so a
+lookup stays fast on village-level layers with tens of thousands of
+features; the best candidates are then scored by edit similarity.
+Matches above a threshold are accepted only when they are clearly ahead
+of every other township, which is checked against all townships that
+can come close (see TrigramIndex.within); the rest are reported as
+suggestions.
+"""
+
+from collections import Counter
+import math
+from dataclasses import dataclass, asdict
+from difflib import SequenceMatcher
+import re
+import threading
+
+from qgis.core import QgsFeatureRequest
+
+from .cache_utils import content_hash, dataset_files
+from .map_join import normalize_pcode, normalize_pcodes
+
+
+# Trigrams found in more than this share of the entries do not select candidates
+MAX_POSTING_SHARE = 0.02
+CANDIDATES = 25
+ACCEPT_MARGIN = 0.05
+# Most entries scored to confirm a match; with more close candidates it is only suggested
+MAX_SCORED = 500
+MAX_CACHED_INDEXES = 4
+
+_NAME_CHARS = re.compile(r'[^0-9a-z]+')
+_indexes = {}
+_lock = threading.Lock()
+
+
+def normalize_name(value):
+    """Lower case letters and digits only, words separated by one space"""
+    return _NAME_CHARS.sub(' ', str(value).lower()).strip()
+
+
+def trigrams(text):
+    """Distinct trigrams of a string padded with spaces"""
+    return frozenset(_gram_list(text))
+
+
+def _gram_list(text):
+    if not text:
+        return []
+    padded = f'  {text} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def min_shared_trigrams(la, lb, cutoff, repeat=1):
+    """Fewest distinct shared trigrams of strings of lengths la and lb scoring at least cutoff
+
+    None when the lengths alone rule the score out. A score of cutoff
+    needs a common subsequence of L >= cutoff * (la + lb) / 2 characters;
+    reaching it takes la - L deletions and lb - L insertions, each
+    breaking at most 3 of the la + 1 padded trigrams, so at least
+    6L - 2la - 3lb + 1 trigrams (with repeats) are shared. repeat is the
+    most times one trigram occurs in the first string.
+    """
+    if la + lb == 0 or 2 * min(la, lb) / (la + lb) < cutoff:
+        return None
+    common = math.ceil(cutoff * (la + lb) / 2 - 1e-9)
+    shared = 6 * common - 2 * la - 3 * lb + 1
+    return max(0, math.ceil(shared / repeat))
+
+
+def similarity(a, b):
+    """0..1 edit similarity of two normalized strings"""
+    return SequenceMatcher(None, a, b).ratio() if a and b else 0.0
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to entry numbers"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.grams = [trigrams(text) for text in self.texts]
+        self.postings = {}
+        for n, grams in enumerate(self.grams):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(n)
+        self.max_posting = max(1, int(len(self.grams) * MAX_POSTING_SHARE))
+        self.lengths = {len(text) for text in self.texts}
+
+    def scores(self, text, limit=CANDIDATES):
+        """{entry: similarity} for the best candidates of text
+
+        Candidates come from the query's selective trigrams (or its rarest
+        ones when all are common), ranked by shared trigrams; only the top
+        `limit` are scored.
+        """
+        grams = trigrams(text)
+        posted = sorted((g for g in grams if g in self.postings), key=lambda g: len(self.postings[g]))
+        if not posted:
+            return {}
+        selective = [g for g in posted if len(self.postings[g]) <= self.max_posting] or posted[:2]
+        hits = Counter()
+        for gram in selective:
+            hits.update(self.postings[gram])
+        return {n: similarity(text, self.texts[n]) for n, _ in hits.most_common(limit)}
+
+    def within(self, text, cutoff):
+        """{entry: similarity} including every entry that can score cutoff or more, or None"""
+        entries = self.candidates(text, cutoff)
+        if entries is None:
+            return None
+        return {n: similarity(text, self.texts[n]) for n in entries}
+
+    def candidates(self, text, cutoff, among=None, limit=MAX_SCORED):
+        """Set of every entry (of among, if given) that can score cutoff or more
+
+        Entries are ruled out by length and by the trigrams they share with
+        text (see min_shared_trigrams). Returns None when more than limit
+        entries remain, or when a short or garbled text could score cutoff
+        without sharing any trigram and the index has more than CANDIDATES
+        entries, as every entry would have to be scored.
+        """
+        if not text:
+            return set()
+        grams = trigrams(text)
+        repeat = max(Counter(_gram_list(text)).values())
+        needed = {}
+        for length in self.lengths:
+            shared = min_shared_trigrams(len(text), length, cutoff, repeat)
+            if shared is not None:
+                needed[length] = shared
+        if not needed:
+            return set()
+
+        fewest = min(needed.values())
+        if among is not None:
+            candidates = among
+        elif fewest == 0:
+            if len(self.texts) > CANDIDATES:
+                return None
+            candidates = range(len(self.texts))
+        else:
+            # An entry sharing `fewest` of the query's trigrams has one of any len - fewest + 1 of them
+            rarest = sorted(grams, key=lambda g: len(self.postings.get(g, ())))
+            candidates = set()
+            for gram in rarest[:len(rarest) - fewest + 1]:
+                candidates.update(self.postings.get(gram, ()))
+
+        result = set()
+        for n in candidates:
+            shared = needed.get(len(self.texts[n]))
+            if shared is not None and (not shared or len(grams & self.grams[n]) >= shared):
+                result.add(n)
+        return result if limit is None or len(result) <= limit else None
+
+
+@dataclass
+class MatchSuggestion:
+    """Closest township for a data row without an exact P_Code match"""
+    pcode: str
+    name: str
+    suggested_pcode: str
+    suggested_name: str
+    score: float
+    accepted: bool
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class MatchIndex:
+    """Trigram indexes of one township layer's P_Codes and names"""
+
+    def __init__(self, pcodes, names=None):
+        self.pcodes = [normalize_pcode(p) for p in pcodes]
+        self.known = set(self.pcodes)
+        self.names = [str(n) if n is not None else '' for n in (names or [''] * len(self.pcodes))]
+        self.pcode_index = TrigramIndex(self.pcodes)
+        self.name_index = TrigramIndex([normalize_name(n) for n in self.names])
+
+    @classmethod
+    def from_layer(cls, layer, pcode_field, name_field=''):
+        fields = layer.fields()
+        has_names = bool(name_field) and fields.indexOf(name_field) >= 0
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([pcode_field] + ([name_field] if has_names else []), fields)
+        pcodes, names = [], []
+        for feature in layer.getFeatures(request):
+            pcodes.append(feature[pcode_field])
+            names.append(feature[name_field] if has_names else '')
+        return cls(pcodes, names)
+
+    def best(self, pcode, name=''):
+        """[(entry, score)] best first; P_Code and name similarity averaged when both are given"""
+        by_pcode = self.pcode_index.scores(normalize_pcode(pcode)) if pcode else {}
+        name = normalize_name(name) if name else ''
+        by_name = self.name_index.scores(name) if name else {}
+        scores = {}
+        for n in set(by_pcode) | set(by_name):
+            parts = []
+            if pcode:
+                parts.append(by_pcode.get(n, similarity(normalize_pcode(pcode), self.pcodes[n])))
+            if name:
+                parts.append(by_name.get(n, similarity(name, self.name_index.texts[n])))
+            scores[n] = sum(parts) / len(parts)
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+    def complete(self, pcode, name, cutoff):
+        """{entry: score} including every entry that can score cutoff or more, or None if unknown"""
+        pcode = normalize_pcode(pcode) if pcode else ''
+        name = normalize_name(name) if name else ''
+        if pcode and name:
+            # An average of at least cutoff needs each part to reach 2 * cutoff - 1
+            # Entries must pass on both sides, so one side's candidates narrow the other;
+            # when the P_Code cannot narrow them down, the name has to
+            part_cutoff = 2 * cutoff - 1
+            entries = self.pcode_index.candidates(pcode, part_cutoff, limit=None)
+            entries = self.name_index.candidates(name, part_cutoff, among=entries)
+            if entries is None:
+                return None
+            return {n: (similarity(pcode, self.pcodes[n]) + similarity(name, self.name_index.texts[n])) / 2
+                    for n in entries}
+        if pcode:
+            return self.pcode_index.within(pcode, cutoff)
+        return self.name_index.within(name, cutoff)
+
+    def suggest(self, pcode, name='', threshold=0.85, taken=()):
+        """MatchSuggestion for one row, or None when nothing is similar
+
+        A match is accepted when it scores at least threshold, leads every
+        other township by ACCEPT_MARGIN and its P_Code has no exact row
+        already. The lead is checked against all townships that can score
+        within the margin; when those cannot be narrowed down, the match
+        is only suggested.
+        """
+        ranked = self.best(pcode, name)
+        if not ranked:
+            return None
+        entry, score = ranked[0]
+        accepted = False
+        if score >= threshold:
+            scores = self.complete(pcode, name, score - ACCEPT_MARGIN)
+            if scores:
+                ranked = sorted(scores.items(), key=lambda item: -item[1])
+                entry, score = ranked[0]
+                runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+                accepted = (score >= threshold and score - runner_up >= ACCEPT_MARGIN
+                            and self.pcodes[entry] not in taken)
+        suggested = self.pcodes[entry]
+        return MatchSuggestion(str(pcode), '' if name is None else str(name), suggested, self.names[entry],
+                               round(score, 3), accepted)
+
+
+def match_index(layer, path, pcode_field, name_field=''):
+    """MatchIndex of a township layer, built once per file contents and fields"""
+    key = (content_hash(*dataset_files(path)), pcode_field, name_field)
+    with _lock:
+        index = _indexes.get(key)
+    if index is None:
+        index = MatchIndex.from_layer(layer, pcode_field, name_field)
+        with _lock:
+            while len(_indexes) >= MAX_CACHED_INDEXES:
+                _indexes.pop(next(iter(_indexes)))
+            _indexes[key] = index
+    return index
+
+
+def resolve_unmatched(df, index, pcode_col, name_col='', threshold=0.85):
+    """Rewrite the P_Codes of rows that fuzzy-match a township; returns (df, suggestions)
+
+    Only rows whose P_Code has no exact match are looked up, one lookup
+    per distinct P_Code. df is returned unchanged when nothing is accepted.
+    """
+    data = df[df[pcode_col].notna()]
+    keys = normalize_pcodes(data[pcode_col])
+    unmatched = ~keys.isin(index.known)
+    if not unmatched.any():
+        return df, []
+
+    taken = set(keys[~unmatched])
+    names = data[name_col] if name_col and name_col in data.columns else None
+    suggestions, replace = [], {}
+    for row, key in keys[unmatched].drop_duplicates().items():
+        name = names.loc[row] if names is not None else ''
+        suggestion = index.suggest(key, '' if name != name else name, threshold, taken)
+        if suggestion is None:
+            continue
+        if suggestion.accepted:
+            replace[key] = suggestion.suggested_pcode
+            taken.add(suggestion.suggested_pcode)
+        suggestions.append(suggestion)
+
+    if replace:
+        fixed = keys.map(replace)
+        df = df.copy()
+        df[pcode_col] = df[pcode_col].astype(object)
+        df.loc[fixed.dropna().index, pcode_col] = fixed.dropna()
+    return df, suggestions
+
+
+def apply_fuzzy_match(config, layer, df):
+    """resolve_unmatched for a MapConfig, or (df, []) when fuzzy matching is off"""
+    if not config.fuzzy_match:
+        return df, []
+    index = match_index(layer, config.township_path, config.pcode_shp, config.name_shp)
+    return resolve_unmatched(df, index, config.pcode_excel, config.township_col, config.match_threshold)
@@ -0,0 +1,60 @@
+"""
+Myanmar Map Generator - Category key tests
+
+Needs a QGIS Python environment; run from the folder above the plugin:
+python -m pytest myanmar_map_plugin/tests
+"""
+
+import pytest
+
+pytest.importorskip('qgis.core')
+
+from qgis.core import NULL, QgsExpression, QgsExpressionContext, QgsFeature, QgsVectorLayer  # noqa: E402
+
+from ..map_core import start_qgis  # noqa: E402
+from ..map_pipeline import binary_counts, build_renderer, category_counts, category_expression  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def layer():
+    app = start_qgis()
+    layer = QgsVectorLayer('Point?field=flag:boolean&field=share:double&field=name:string', 'test', 'memory')
+    rows = [(True, 2.5, 'A'), (False, 1.0, 'B'), (True, 0.1, ''), (NULL, NULL, NULL)]
+    features = []
+    for row in rows:
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes(list(row))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    yield layer
+    app.exitQgis()
+
+
+def _render_keys(layer, column):
+    expression = QgsExpression(category_expression(column))
+    context = QgsExpressionContext()
+    context.setFields(layer.fields())
+    keys = []
+    for feature in layer.getFeatures():
+        context.setFeature(feature)
+        keys.append(str(expression.evaluate(context)))
+    return keys
+
+
+@pytest.mark.parametrize('column', ['flag', 'share', 'name'])
+def test_counts_use_render_keys(layer, column):
+    keys = _render_keys(layer, column)
+    counts = category_counts(layer, column)
+    assert sorted(counts.elements()) == sorted(keys)
+
+
+@pytest.mark.parametrize('column', ['flag', 'share'])
+def test_every_feature_has_a_category(layer, column):
+    renderer = build_renderer(layer, column, True, '#ff0000', '#cccccc')
+    values = {category.value() for category in renderer.categories()}
+    assert set(_render_keys(layer, column)) <= values
+
+
+def test_binary_counts_trim_like_the_renderer():
+    counts = binary_counts({'A': 2, ' NA ': 1, 'NA': 3, '  ': 1})
+    assert counts == {'Has Data': 2, 'No Data': 5}
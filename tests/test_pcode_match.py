@@ -0,0 +1,62 @@
+"""
+Myanmar Map Generator - Fuzzy P_Code matching tests
+
+Needs a QGIS Python environment; run from the folder above the plugin:
+python -m pytest myanmar_map_plugin/tests
+"""
+
+import pytest
+
+pytest.importorskip('qgis.core')
+
+from .. import pcode_match  # noqa: E402
+from ..pcode_match import CANDIDATES, MatchIndex, TrigramIndex, similarity  # noqa: E402
+
+
+def test_single_close_code_is_accepted():
+    index = MatchIndex(['MMR001001', 'MMR002002', 'MMR003005'])
+    suggestion = index.suggest('MMR00101')
+    assert suggestion.suggested_pcode == 'MMR001001'
+    assert suggestion.accepted
+
+
+def test_equally_close_codes_are_not_accepted():
+    # 'MMR00105' is one insertion away from both codes
+    index = MatchIndex(['MMR001015', 'MMR001005', 'MMR002001'])
+    suggestion = index.suggest('MMR00105')
+    assert suggestion.score == pytest.approx(0.941, abs=0.001)
+    assert not suggestion.accepted
+
+
+def test_equally_close_codes_among_many_are_not_accepted():
+    # Both close codes share only common trigrams with the query
+    codes = [f'MMR{state:03d}{township:03d}' for state in range(1, 400) for township in range(1, 6)]
+    suggestion = MatchIndex(codes + ['MMR001015']).suggest('MMR00105')
+    assert suggestion.suggested_pcode in ('MMR001005', 'MMR001015')
+    assert not suggestion.accepted
+
+
+def test_within_keeps_every_entry_above_cutoff():
+    texts = ['mmr001015', 'mmr001005', 'mmr002001', 'mmr101005', 'ygn001', 'mmr00105x']
+    index = TrigramIndex(texts)
+    for query in ('mmr00105', 'mmr0010', 'ygn01'):
+        for cutoff in (0.6, 0.8, 0.9):
+            found = index.within(query, cutoff)
+            assert all(n in found for n, text in enumerate(texts) if similarity(query, text) >= cutoff)
+
+
+def test_garbled_code_is_not_scored_against_every_township(monkeypatch):
+    codes = [f'MMR{state:03d}{township:03d}' for state in range(1, 400) for township in range(1, 6)]
+    names = [f'Town {n}' for n in range(len(codes))]
+    index = MatchIndex(codes, names)
+    calls = []
+
+    def counting(a, b):
+        calls.append((a, b))
+        return similarity(a, b)
+
+    monkeypatch.setattr(pcode_match, 'similarity', counting)
+    for pcode, name in (('M1', ''), ('M1', 'Tw'), ('XQ7', 'Zq')):
+        calls.clear()
+        index.suggest(pcode, name, threshold=0.0)
+        assert len(calls) <= 4 * CANDIDATES
@@ -0,0 +1,347 @@
+"""
+Myanmar Map Generator - Web export
+
+Writes the joined township layer for web maps: quantized TopoJSON or
+compact GeoJSON in WGS 84, with only the P_Code, name, category and
+label fields, plus a style JSON with the renderer's colours. Shared
+borders are cut into arcs and each arc is simplified once, so
+neighbouring townships stay gap-free after simplification.
+"""
+
+from pathlib import Path
+import json
+import math
+import os
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsCoordinateTransformContext, QgsFeatureRequest
+)
+
+from .cache_utils import atomic_write
+from .map_aggregate import LEVELS, name_column, unit_pcode_field
+from .map_metrics import noop, stage
+from .map_pipeline import category_keys
+
+
+FORMATS = ('topojson', 'geojson')
+# Grid size of the quantized coordinates (TopoJSON transform)
+QUANTIZATION = 100000
+OBJECT_NAME = 'townships'
+
+_WGS84 = 'EPSG:4326'
+
+
+def web_targets(config):
+    """(map data path, style path) of a web export"""
+    if config.web_format not in FORMATS:
+        raise ValueError(f'Unknown web format "{config.web_format}", expected one of {", ".join(FORMATS)}')
+    base = Path(config.output_path) / config.title.replace(' ', '_')
+    return f'{base}.{config.web_format}', f'{base}.style.json'
+
+
+def web_fields(config):
+    """(P_Code, name, category, label) fields written for each feature"""
+    pcode = unit_pcode_field(config) if config.level in LEVELS else config.pcode_shp
+    return pcode, name_column(config), config.category_col, config.label_col
+
+
+def export_web(build, is_canceled=None, metrics=None):
+    """Write the map data and style of a build; returns the paths, or None if cancelled"""
+    is_canceled = is_canceled or noop
+    config = build.config
+    data_path, style_path = web_targets(config)
+    pcode_field, name_field, category_col, label_col = web_fields(config)
+
+    with stage(metrics, 'web_export', format=config.web_format) as record:
+        features = read_features(build.township_layer, (pcode_field, name_field, category_col, label_col))
+        if is_canceled():
+            return None
+        topology = Topology([rings for rings, _ in features])
+        topology.simplify(config.web_tolerance)
+        if is_canceled():
+            return None
+        key = category_keys(build.township_layer.fields(), category_col)
+        properties = [dict(props, **{category_col: _category(key, props.get(category_col))})
+                      for _, props in features]
+        if config.web_format == 'topojson':
+            data = topology.to_topojson(properties, pcode_field)
+        else:
+            data = topology.to_geojson(properties, pcode_field)
+        _write_json(data_path, data)
+        _write_json(style_path, web_style(build))
+        record.update(features=len(features), arcs=len(topology.arcs), bytes=os.path.getsize(data_path))
+    return [data_path, style_path]
+
+
+def _category(key, value):
+    """Category key as in the renderer; blank values are no data"""
+    value = key(value)
+    return value if value.strip() else 'NA'
+
+
+def web_style(build):
+    """Colour per category key, the no-data/default colour and the legend of the renderer"""
+    config = build.config
+    _, name_field, category_col, label_col = web_fields(config)
+    colors, legend = {}, []
+    default = config.no_data_color
+    opacity, stroke = 1.0, '#ffffff'
+    for category in build.renderer.categories():
+        symbol = category.symbol()
+        color = symbol.color().name()
+        opacity = symbol.opacity()
+        stroke = symbol.symbolLayer(0).strokeColor().name()
+        legend.append({'value': category.value(), 'label': category.label(), 'color': color})
+        if config.multi_color:
+            colors[category.value()] = color
+        elif category.value() == 'No Data':
+            colors['NA'] = color
+        else:
+            default = color
+    return {
+        'title': config.title,
+        'property': category_col,
+        'colors': colors,
+        'default': default,
+        'opacity': round(opacity, 3),
+        'stroke': stroke,
+        'name_property': name_field,
+        'label_property': label_col if config.show_labels else None,
+        'legend': legend,
+    }
+
+
+def read_features(layer, field_names):
+    """[(polygons, properties)] in WGS 84; polygons are lists of rings of (x, y)"""
+    fields = layer.fields()
+    names = [f for f in dict.fromkeys(field_names) if f and fields.indexOf(f) >= 0]
+    request = QgsFeatureRequest()
+    request.setSubsetOfAttributes(names, fields)
+    target = QgsCoordinateReferenceSystem(_WGS84)
+    transform = None
+    if layer.crs() != target:
+        transform = QgsCoordinateTransform(layer.crs(), target, QgsCoordinateTransformContext())
+
+    features = []
+    for feature in layer.getFeatures(request):
+        if not feature.hasGeometry():
+            continue
+        geometry = feature.geometry()
+        if transform is not None:
+            geometry.transform(transform)
+        polygons = geometry.asMultiPolygon() if geometry.isMultipart() else [geometry.asPolygon()]
+        rings = [[[(p.x(), p.y()) for p in ring] for ring in polygon] for polygon in polygons if polygon]
+        features.append((rings, {name: _json_value(feature[name]) for name in names}))
+    return features
+
+
+def _json_value(value):
+    if value is None or value != value:
+        return None
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, 'isNull') and value.isNull():
+        return None
+    return str(value)
+
+
+class Topology:
+    """Polygons cut into shared arcs on a quantized grid
+
+    Rings are cut wherever a vertex has different neighbours in different
+    rings (a junction); identical arcs, in either direction, are stored
+    once. Features refer to arcs by index, ~index when reversed.
+    """
+
+    def __init__(self, features):
+        points = [p for polygons in features for polygon in polygons for ring in polygon for p in ring]
+        if points:
+            xs, ys = [p[0] for p in points], [p[1] for p in points]
+            self.bbox = [min(xs), min(ys), max(xs), max(ys)]
+        else:
+            self.bbox = [0.0, 0.0, 0.0, 0.0]
+        x0, y0, x1, y1 = self.bbox
+        self.scale = [(x1 - x0) / (QUANTIZATION - 1) or 1.0, (y1 - y0) / (QUANTIZATION - 1) or 1.0]
+
+        quantized = [[[self._ring(ring) for ring in polygon] for polygon in polygons] for polygons in features]
+        self.junctions = _junctions(ring for polygons in quantized for polygon in polygons for ring in polygon)
+        self.arcs = []
+        self._index = {}
+        self.geometries = [
+            [[self._cut(ring) for ring in polygon if len(ring) >= 4] for polygon in polygons
+             if polygon and len(polygon[0]) >= 4]
+            for polygons in quantized
+        ]
+
+    def _ring(self, ring):
+        """Quantized, closed ring without repeated vertices"""
+        x0, y0 = self.bbox[:2]
+        kx, ky = self.scale
+        result = []
+        for x, y in ring:
+            point = (round((x - x0) / kx), round((y - y0) / ky))
+            if not result or point != result[-1]:
+                result.append(point)
+        if result and result[0] != result[-1]:
+            result.append(result[0])
+        return result
+
+    def _cut(self, ring):
+        """Arc indexes making up one closed ring"""
+        open_ring = ring[:-1]
+        cuts = [i for i, point in enumerate(open_ring) if point in self.junctions]
+        if not cuts:
+            return [self._arc(_rotated(open_ring), closed=True)]
+        start = cuts[0]
+        rotated = open_ring[start:] + open_ring[:start]
+        cuts = [i - start for i in cuts] + [len(rotated)]
+        rotated.append(rotated[0])
+        return [self._arc(rotated[a:b + 1]) for a, b in zip(cuts, cuts[1:])]
+
+    def _arc(self, coords, closed=False):
+        key = tuple(coords)
+        if key in self._index:
+            return self._index[key]
+        reverse = key[::-1] if not closed else tuple(_rotated(list(key[-2::-1])))
+        if reverse in self._index:
+            return ~self._index[reverse]
+        self._index[key] = len(self.arcs)
+        self.arcs.append(list(coords))
+        return len(self.arcs) - 1
+
+    def simplify(self, tolerance):
+        """Douglas-Peucker on every arc; tolerance is in degrees"""
+        if tolerance <= 0:
+            return
+        tolerance = tolerance / min(self.scale)
+        self.arcs = [_simplify_closed(arc, tolerance) if arc[0] == arc[-1] else _simplify(arc, tolerance)
+                     for arc in self.arcs]
+
+    def _polygons(self, geometry):
+        """Drop rings that simplification collapsed below a triangle"""
+        polygons = []
+        for polygon in geometry:
+            rings = [ring for ring in polygon if sum(len(self.arcs[i if i >= 0 else ~i]) - 1 for i in ring) >= 3]
+            if rings and rings[0] is polygon[0]:
+                polygons.append(rings)
+        return polygons
+
+    def to_topojson(self, properties, id_field):
+        """TopoJSON topology with delta-encoded arcs"""
+        geometries = []
+        for geometry, props in zip(self.geometries, properties):
+            polygons = self._polygons(geometry)
+            item = {'type': 'MultiPolygon', 'arcs': polygons}
+            if len(polygons) == 1:
+                item = {'type': 'Polygon', 'arcs': polygons[0]}
+            elif not polygons:
+                item = {'type': None}
+            if props.get(id_field) is not None:
+                item['id'] = props[id_field]
+            item['properties'] = props
+            geometries.append(item)
+        return {
+            'type': 'Topology',
+            'bbox': self.bbox,
+            'transform': {'scale': self.scale, 'translate': self.bbox[:2]},
+            'objects': {OBJECT_NAME: {'type': 'GeometryCollection', 'geometries': geometries}},
+            'arcs': [_delta(arc) for arc in self.arcs],
+        }
+
+    def to_geojson(self, properties, id_field):
+        """GeoJSON FeatureCollection rounded to the quantization grid"""
+        x0, y0 = self.bbox[:2]
+        kx, ky = self.scale
+        digits = max(0, math.ceil(-math.log10(min(kx, ky))))
+        features = []
+        for geometry, props in zip(self.geometries, properties):
+            polygons = [[[[round(x0 + x * kx, digits), round(y0 + y * ky, digits)] for x, y in self._ring_coords(ring)]
+                         for ring in polygon] for polygon in self._polygons(geometry)]
+            shape = None
+            if len(polygons) == 1:
+                shape = {'type': 'Polygon', 'coordinates': polygons[0]}
+            elif polygons:
+                shape = {'type': 'MultiPolygon', 'coordinates': polygons}
+            feature = {'type': 'Feature', 'geometry': shape, 'properties': props}
+            if props.get(id_field) is not None:
+                feature['id'] = props[id_field]
+            features.append(feature)
+        return {'type': 'FeatureCollection', 'bbox': self.bbox, 'features': features}
+
+    def _ring_coords(self, ring):
+        coords = []
+        for i in ring:
+            arc = self.arcs[i] if i >= 0 else self.arcs[~i][::-1]
+            coords.extend(arc if not coords else arc[1:])
+        return coords
+
+
+def _junctions(rings):
+    """Vertices that have different neighbours in different rings"""
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        open_ring = ring[:-1]
+        n = len(open_ring)
+        for i, point in enumerate(open_ring):
+            pair = frozenset((open_ring[i - 1], open_ring[(i + 1) % n]))
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair:
+                junctions.add(point)
+    return junctions
+
+
+def _rotated(open_ring):
+    """Closed ring starting at its smallest vertex, so equal rings compare equal"""
+    start = open_ring.index(min(open_ring))
+    return open_ring[start:] + open_ring[:start + 1]
+
+
+def _simplify(points, tolerance):
+    """Douglas-Peucker keeping both end points"""
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = points[first], points[last]
+        dx, dy = bx - ax, by - ay
+        length = math.hypot(dx, dy)
+        farthest, distance = 0, tolerance
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length:
+                d = abs(dy * (px - ax) - dx * (py - ay)) / length
+            else:
+                d = math.hypot(px - ax, py - ay)
+            if d > distance:
+                farthest, distance = i, d
+        if farthest:
+            keep[farthest] = True
+            stack += [(first, farthest), (farthest, last)]
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def _simplify_closed(points, tolerance):
+    """Closed arc split at the vertex farthest from its start, so it stays a ring"""
+    ax, ay = points[0]
+    middle = max(range(len(points)), key=lambda i: (points[i][0] - ax) ** 2 + (points[i][1] - ay) ** 2)
+    if middle in (0, len(points) - 1):
+        return points
+    return _simplify(points[:middle + 1], tolerance) + _simplify(points[middle:], tolerance)[1:]
+
+
+def _delta(arc):
+    result, px, py = [], 0, 0
+    for x, y in arc:
+        result.append([x - px, y - py])
+        px, py = x, y
+    return result
+
+
+def _write_json(path, data):
+    """Compact JSON written to a temporary file and moved into place"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, json.dumps(data, separators=(',', ':'), ensure_ascii=False))